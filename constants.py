@@ -44,7 +44,9 @@ ORG_ID = secrets.get("ORG_ID")
 REGION = secrets.get("REGION")
 MODEL_ID = secrets.get("MODEL_ID")
 ACCOUNT_TABLE_NAME = secrets.get("ACCOUNT_TABLE_NAME")
+ACCOUNT_EMAIL_TABLE_NAME = secrets.get("ACCOUNT_EMAIL_TABLE_NAME")
 TEAM_TABLE_NAME = secrets.get("TEAM_TABLE_NAME")
 EMBED_MODEL_ID = secrets.get("EMBED_MODEL_ID")
 EMBED_TABLE_NAME = secrets.get("EMBED_TABLE_NAME")
+EMBED_BODY_BUCKET = secrets.get("EMBED_BODY_BUCKET", "cwm-embed-bodies")
 ACCOUNT_RESTRICTION_TABLE_NAME = secrets.get("ACCOUNT_RESTRICTION_TABLE_NAME")
\ No newline at end of file
@@ -1,12 +1,14 @@
-SSM_DOCUMENT_NAME = "CreateRDPUserAndConnectProfile"
+# Versioned name: the parameters changed (raw JSON instead of Base64), and an
+# existing document with the old name is reused as-is by the caller
+SSM_DOCUMENT_NAME = "CreateRDPUserAndConnectProfileV2"
 
 SSM_DOCUMENT_CONTENT = """
   schemaVersion: '2.2'
-  description: "Create RDP users and TSplus .connect profiles on Windows EC2 (Base64 JSON input)"
+  description: "Create RDP users and TSplus .connect profiles on Windows EC2 (JSON input)"
   parameters:
-    UsersJsonBase64:
+    UsersJson:
       type: String
-      description: "Base64-encoded JSON list of user objects with fields: Username, PasswordPlain, ServerIP, DisplayMode, PrinterAction, PrinterScale, CommonGroups, Groups"
+      description: "Single-line JSON list of user objects with fields: Username, PasswordPlain, ServerIP, DisplayMode, PrinterAction, PrinterScale, CommonGroups, Groups"
     S3BucketName:
       type: String
       description: "S3 bucket name to upload .connect files"
@@ -22,7 +24,9 @@ SSM_DOCUMENT_CONTENT = """
         runCommand:
           - |
             Write-Host "=== Starting TSplus user creation ==="
-            $jsonDecoded = [System.Text.Encoding]::UTF8.GetString([System.Convert]::FromBase64String("{{ UsersJsonBase64 }}"))
+            $jsonDecoded = @'
+            {{ UsersJson }}
+            '@
             $users = ConvertFrom-Json $jsonDecoded
             $adminDesktop = "C:\\Users\\Public\\Desktop"
             $generatorExe = Join-Path "${env:ProgramFiles(x86)}\\TSplus\\Clients\\WindowsClient" "ClientGenerator.exe"
@@ -80,6 +80,8 @@ zip -r "$DEPLOYMENT_PACKAGE" \
     zoho_integration.py \
     zoho_private_comment.py \
     zoho_alarm_pvt_comment.py \
+    zoho_auth.py \
+    zoho_http.py \
     teams_integration.py \
     send_teams_webhook.py \
     first_response.py \
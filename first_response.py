@@ -76,11 +76,12 @@ def extract_email(address):
     return match.group(0) if match else address
 
 
-def send_email_reply(ticket_id, from_emails, to_emails, cc_emails, reply_text):
+def send_email_reply(ticket_id, from_emails, to_emails, cc_emails, reply_text, access_token=None):
     logger.info("Preparing to send email reply to ticket ID: %s", ticket_id)
 
     try:
-        access_token = get_access_token()
+        # Callers that already fetched a token (e.g. in parallel with other work) can pass it in
+        access_token = access_token or get_access_token()
     except Exception as e:
         logger.error("Access token error: %s", str(e))
         return {
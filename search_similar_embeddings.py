@@ -4,6 +4,7 @@ import time
 from collections import Counter
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from constants import EMBED_TABLE_NAME
+from ticket_embeddings import load_offloaded_body
 
 dynamodb = boto3.resource("dynamodb")
 table = dynamodb.Table(EMBED_TABLE_NAME)
@@ -50,16 +51,30 @@ def process_batch(items, new_ticket_body, threshold):
         past_body = item.get("ticketBody", "")
         similarity = compute_cosine_similarity(new_ticket_body, past_body)
         if similarity >= threshold:
-            similarities.append({
+            match = {
                 "ticketId": item.get("ticketId"),
                 "ticketSubject": item.get("ticketSubject"),
                 "ticketBody": past_body,
                 "response": item.get("response"),
                 "similarity": round(similarity, 3),
                 "timestamp": item.get("timestamp")
-            })
+            }
+            if "response_s3_key" in item:
+                match["response_s3_key"] = item["response_s3_key"]
+            similarities.append(match)
     return similarities
 
+def load_match_response(match):
+    """
+    Restore a match's offloaded response from S3. If that fails, the match is
+    returned without it rather than failing the whole search.
+    """
+    try:
+        return load_offloaded_body(match)
+    except Exception as e:
+        print(f"Error loading offloaded response for ticket {match.get('ticketId')}: {str(e)}")
+        return {k: v for k, v in match.items() if k != "response_s3_key"}
+
 def parallel_scan_with_pagination(table, new_ticket_body, threshold=0.7, max_workers=4):
     """
     Perform parallel scan with pagination to handle large datasets efficiently.
@@ -127,7 +142,8 @@ def search_similar_ticket_response(new_ticket_body, threshold=0.7, top_n=3, max_
         
         # Sort by highest similarity and return top N
         all_similarities.sort(key=lambda x: x["similarity"], reverse=True)
-        result = all_similarities[:top_n]
+        # Offloaded responses are fetched from S3 only for the results returned
+        result = [load_match_response(match) for match in all_similarities[:top_n]]
         
         end_time = time.time()
         processing_time = round(end_time - start_time, 2)
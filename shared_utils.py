@@ -189,6 +189,36 @@ def get_aws_client(service: str, region: str = 'ap-south-1',
         )
     return boto3.client(service, region_name=region)
 
+# ============================================================================
+# JSON UTILITIES
+# ============================================================================
+
+# orjson is several times faster for secret payloads, API responses and model
+# output; the standard library is used when it is not installed
+try:
+    import orjson
+
+    json_loads = orjson.loads
+
+    def json_dumps(obj: Any) -> str:
+        """Serialize obj to a JSON string (compact when orjson is used)"""
+        return orjson.dumps(obj).decode()
+except ImportError:
+    json_loads = json.loads
+    json_dumps = json.dumps
+
+# ============================================================================
+# TIME UTILITIES
+# ============================================================================
+
+def utc_timestamp(epoch: Optional[float] = None) -> str:
+    """
+    ISO 8601 UTC timestamp ('2025-01-07T10:00:00Z') for epoch seconds (default: now).
+    Formats time.gmtime() fields directly, avoiding a datetime object per call.
+    """
+    t = time.gmtime(epoch)
+    return f"{t.tm_year}-{t.tm_mon:02d}-{t.tm_mday:02d}T{t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}Z"
+
 # ============================================================================
 # VALIDATION UTILITIES
 # ============================================================================
@@ -2,41 +2,79 @@ import logging
 import json
 import boto3
 import re
-from datetime import datetime, timezone
+import numpy as np
+from functools import lru_cache
 from boto3.dynamodb.conditions import Attr
 from send_teams_webhook import send_to_teams_webhook, send_basic_teams_webhook
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
 from constants import ACCOUNT_TABLE_NAME , TEAM_TABLE_NAME
+from shared_utils import utc_timestamp
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-dynamodb = boto3.resource('dynamodb')
-account_table = dynamodb.Table(ACCOUNT_TABLE_NAME)
-team_table = dynamodb.Table(TEAM_TABLE_NAME)
+# Tables are built on first use so cold starts that exit early skip boto3 setup
+@lru_cache(maxsize=1)
+def _account_table():
+    return boto3.resource('dynamodb').Table(ACCOUNT_TABLE_NAME)
 
-SUPPORT_EMAILS = [
+@lru_cache(maxsize=1)
+def _team_table():
+    return boto3.resource('dynamodb').Table(TEAM_TABLE_NAME)
+
+# Only the attributes handle_custom and send_alarm_to_uptime_team read
+ACCOUNT_PROJECTION = "AccountId, AccountName, TeamId, TeamName, TeamEmailIds, CustomerEmailIds"
+TEAM_PROJECTION = "TeamName, TeamsURL"
+
+_EMAIL_RE = re.compile(r'[\w.-]+@[\w.-]+')
+
+SUPPORT_EMAILS = frozenset({
     "support@cloudworkmates.com",
     "support@2demo2cloudworkmates.zohodesk.in"
-]
+})
 
-def similarity(a, b):
-    return fuzz.token_sort_ratio(a.lower(), b.lower()) / 100.0
+def prepare_for_scoring(s):
+    """
+    Lowercases and token-sorts a string once so it can be scored with fuzz.ratio,
+    which is equivalent to token_sort_ratio on the raw strings.
+    """
+    return " ".join(sorted(s.lower().split()))
+
+def similarity(a, b, cutoff=80, prepared=False):
+    if not prepared:
+        a, b = prepare_for_scoring(a), prepare_for_scoring(b)
+    # Scores below cutoff short-circuit to 0 inside rapidfuzz. The cutoff is
+    # inclusive, so callers still compare the result strictly (> 0.8).
+    return fuzz.ratio(a, b, score_cutoff=cutoff) / 100.0
 
 def get_timestamp():
-    return datetime.now(timezone.utc).isoformat()
+    return utc_timestamp()
 
 def clean_email_address(email):
     """
     Extracts just the email address from formats like '"Name" <email@domain.com>'
     """
-    match = re.search(r'[\w\.-]+@[\w\.-]+', email)
-    return match.group(0).lower() if match else email.lower()
+    match = _EMAIL_RE.search(email)
+    return (match.group(0) if match else email).lower()
+
+def clean_many(strings):
+    """
+    Bulk version of clean_email_address. Entries that are already bare
+    addresses are only stripped and lowercased; as soon as one entry is
+    anything else, every entry goes through clean_email_address.
+    """
+    stripped = [s.strip() for s in strings]
+    if all(_EMAIL_RE.fullmatch(s) for s in stripped):
+        return [s.lower() for s in stripped]
+    return [clean_email_address(s) for s in strings]
 
 def send_alarm_to_uptime_team(team_name, subject, ticket_id, reply_text, from_email=None, to_emails=None, cc_emails=None):
     try:
         logger.info(f"Fetching Teams webhook for team: {team_name}")
-        response = team_table.scan(FilterExpression=Attr("TeamName").eq(team_name))
+        response = _team_table().scan(
+            FilterExpression=Attr("TeamName").eq(team_name),
+            ProjectionExpression=TEAM_PROJECTION
+        )
         items = response.get("Items", [])
         if not items:
             raise ValueError(f"Team '{team_name}' not found in CWM-Team-Details-Table")
@@ -58,10 +96,8 @@ def send_alarm_to_uptime_team(team_name, subject, ticket_id, reply_text, from_em
         raise
 
 def extract_emails_from_string(s):
-    # Split on commas, then clean each email string
-    parts = [p.strip() for p in s.split(",") if p.strip()]
-    emails = [clean_email_address(p) for p in parts]
-    return emails 
+    # The pattern skips separators, quotes and angle brackets on its own
+    return [m.lower() for m in _EMAIL_RE.findall(s)]
 
 def handle_custom(email, subject, body, reply, ticket_id, from_email=None, to_emails=None, cc_emails=None, image_analysis=None, zoho_account_id=None):
     try:
@@ -76,12 +112,12 @@ def handle_custom(email, subject, body, reply, ticket_id, from_email=None, to_em
         if isinstance(to_emails, list) and len(to_emails) == 1 and "," in to_emails[0]:
             to_emails = extract_emails_from_string(to_emails[0])
         else:
-            to_emails = [clean_email_address(e) for e in (to_emails or [])]
+            to_emails = clean_many(to_emails or [])
 
         if isinstance(cc_emails, list) and len(cc_emails) == 1 and "," in cc_emails[0]:
             cc_emails = extract_emails_from_string(cc_emails[0])
         else:
-            cc_emails = [clean_email_address(e) for e in (cc_emails or [])]
+            cc_emails = clean_many(cc_emails or [])
 
         logger.info(f"Parsed email fields - FROM: {from_email}, TO: {to_emails}, CC: {cc_emails}")
 
@@ -104,8 +140,9 @@ def handle_custom(email, subject, body, reply, ticket_id, from_email=None, to_em
         items = []
         if zoho_account_id:
             logger.info(f"Looking up account using Zoho_Account_Id: {zoho_account_id}")
-            response = account_table.scan(
-                FilterExpression=Attr("Zoho_Account_Id").eq(zoho_account_id)
+            response = _account_table().scan(
+                FilterExpression=Attr("Zoho_Account_Id").eq(zoho_account_id),
+                ProjectionExpression=ACCOUNT_PROJECTION
             )
             items = response.get("Items", [])
 
@@ -129,18 +166,22 @@ def handle_custom(email, subject, body, reply, ticket_id, from_email=None, to_em
                     "headers": {"Content-Type": "application/json"}
                 }
 
-            response = account_table.scan(FilterExpression=Attr("CustomerEmailIds").contains(from_email))
+            response = _account_table().scan(
+                FilterExpression=Attr("CustomerEmailIds").contains(from_email),
+                ProjectionExpression=ACCOUNT_PROJECTION
+            )
             items = response.get("Items", [])
 
             # Step 2: Fuzzy match if no exact match
             if not items:
                 logger.warning(f"No exact match for from_email: {from_email}, trying fuzzy match.")
-                response = account_table.scan()
+                response = _account_table().scan(ProjectionExpression=ACCOUNT_PROJECTION)
+                prepped_from = prepare_for_scoring(from_email)
                 for item in response.get("Items", []):
                     customer_emails_raw = item.get("CustomerEmailIds", "")
                     customer_emails = [email.strip().lower() for email in customer_emails_raw.split(",") if email.strip()]
                     for ce in customer_emails:
-                        if from_email in ce or ce in from_email or similarity(ce, from_email) > 0.8:
+                        if from_email in ce or ce in from_email or similarity(prepare_for_scoring(ce), prepped_from, prepared=True) > 0.8:
                             items.append(item)
                             break
 
@@ -160,31 +201,58 @@ def handle_custom(email, subject, body, reply, ticket_id, from_email=None, to_em
             }
 
         # Step 4: Score matching teams
-        scored_teams = []
+        candidates = []
         for item in items:
             team_name = item.get("TeamName")
-            team_emails = item.get("TeamEmailIds", [])
+            team_emails = list(item.get("TeamEmailIds", []))
             if not team_name or not team_emails:
                 continue
+            candidates.append((team_name, team_emails, item))
+
+        # Fuzzy tier for every to_email x team_email pair in one batched call
+        all_team_emails = [te for _, team_emails, _ in candidates for te in team_emails]
+        fuzzy_scores = process.cdist(
+            [prepare_for_scoring(e) for e in to_emails],
+            [prepare_for_scoring(te) for te in all_team_emails],
+            scorer=fuzz.ratio,
+            score_cutoff=80,
+            # float32 keeps the raw ratio: integer dtypes round, so scores just
+            # under 80 would land on 80 and then pass a strict "> 80" gate
+            dtype=np.float32
+        )
+
+        # Score all pairs as to_emails x team_emails matrices, then sum per team.
+        # np.select keeps the tier priority: each pair scores only its best tier.
+        team_scores = np.zeros(len(candidates), dtype=np.int64)
+        if all_team_emails:
+            to_arr = np.array(to_emails)[:, None]
+            te_arr = np.array(all_team_emails)[None, :]
+            to_domains = np.array([e.rsplit('@', 1)[-1] for e in to_emails])[:, None]
+            # Accounts of the same team repeat its emails, so split each distinct one once
+            te_parts = {te: (te.split('@', 1)[0], te.rsplit('@', 1)[-1]) for te in set(all_team_emails)}
+            # Match each to_email against every distinct local part once, then
+            # fan the hits back out to the team email columns
+            uniq_locals, local_cols = np.unique([te_parts[te][0] for te in all_team_emails], return_inverse=True)
+            te_domains = np.array([te_parts[te][1] for te in all_team_emails])[None, :]
+
+            exact = to_arr == te_arr
+            substring = (np.char.find(te_arr, to_arr) >= 0) | (np.char.find(to_arr, te_arr) >= 0)
+            # Strictly above 80, as the original similarity(...) > 0.8 check
+            fuzzy = fuzzy_scores > 80
+            local = (np.char.find(to_arr, uniq_locals[None, :]) >= 0)[:, local_cols]
+            domain = to_domains == te_domains
+
+            pair_scores = np.select([exact, substring, fuzzy, local, domain], [10, 5, 3, 2, 1], 0).astype(np.int8)
+            pair_scores[np.array([e in SUPPORT_EMAILS for e in to_emails])] = 0
+
+            team_starts = np.cumsum([0] + [len(team_emails) for _, team_emails, _ in candidates[:-1]])
+            team_scores = np.add.reduceat(pair_scores.sum(axis=0, dtype=np.int64), team_starts)
 
-            score = 0
-            for email in to_emails:
-                if email in SUPPORT_EMAILS:
-                    continue
-                for te in team_emails:
-                    if email == te:
-                        score += 10
-                    elif email in te or te in email:
-                        score += 5
-                    elif similarity(email, te) > 0.8:
-                        score += 3
-                    elif re.search(rf"{re.escape(te.split('@')[0])}", email):
-                        score += 2
-                    elif email.split('@')[-1] == te.split('@')[-1]:
-                        score += 1
-
-            if score > 0:
-                scored_teams.append((score, team_name, item))
+        scored_teams = [
+            (int(score), team_name, item)
+            for score, (team_name, _, item) in zip(team_scores, candidates)
+            if score > 0
+        ]
 
         # Step 5: No team found
         if not scored_teams:
@@ -202,7 +270,7 @@ def handle_custom(email, subject, body, reply, ticket_id, from_email=None, to_em
 
         # Step 6: Use best scoring team
         best_score, best_team_name, best_account = max(scored_teams, key=lambda x: x[0])
-        team_response = team_table.get_item(Key={"TeamName": best_team_name})
+        team_response = _team_table().get_item(Key={"TeamName": best_team_name})
         team_item = team_response.get("Item")
 
         if not team_item or not team_item.get("TeamsURL"):
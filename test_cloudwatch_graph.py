@@ -6,6 +6,7 @@ This helps debug why graphs might not show data
 
 import json
 import boto3
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 def test_cloudwatch_graph_generation():
@@ -44,77 +45,116 @@ def test_cloudwatch_graph_generation():
         }
     ]
     
-    for test_case in test_cases:
+    end_time = datetime.utcnow()
+    start_time = end_time - timedelta(hours=24)
+    widgets = [build_widget(test_case) for test_case in test_cases]
+    
+    # One GetMetricData call per region covers every test case in it
+    metric_results = {}
+    query_errors = {}
+    cases_by_region = {}
+    for index, test_case in enumerate(test_cases):
+        cases_by_region.setdefault(test_case['region'], []).append(index)
+    
+    for region, indexes in cases_by_region.items():
+        try:
+            cloudwatch = boto3.client('cloudwatch', region_name=region)
+            metric_data_queries = [
+                {
+                    "Id": f"q{index}",
+                    "MetricStat": {
+                        "Metric": {
+                            "Namespace": test_cases[index]['namespace'],
+                            "MetricName": test_cases[index]['metric_name'],
+                            "Dimensions": [
+                                {"Name": dim['name'], "Value": dim['value']}
+                                for dim in test_cases[index]['dimensions']
+                            ]
+                        },
+                        "Period": test_cases[index]['period'],
+                        "Stat": test_cases[index]['statistic']
+                    }
+                }
+                for index in indexes
+            ]
+            
+            paginator = cloudwatch.get_paginator('get_metric_data')
+            for page in paginator.paginate(
+                MetricDataQueries=metric_data_queries,
+                StartTime=start_time,
+                EndTime=end_time
+            ):
+                for result in page.get('MetricDataResults', []):
+                    entry = metric_results.setdefault(result['Id'], {"Timestamps": [], "Values": []})
+                    entry["Timestamps"].extend(result.get('Timestamps', []))
+                    entry["Values"].extend(result.get('Values', []))
+        except Exception as e:
+            for index in indexes:
+                query_errors[index] = e
+    
+    # Widget images are independent, so render them concurrently
+    def render_widget(index):
+        cloudwatch = boto3.client('cloudwatch', region_name=test_cases[index]['region'])
+        image_response = cloudwatch.get_metric_widget_image(
+            MetricWidget=json.dumps(widgets[index])
+        )
+        return len(image_response['MetricWidgetImage'])
+    
+    with ThreadPoolExecutor(max_workers=len(test_cases)) as executor:
+        image_futures = [executor.submit(render_widget, index) for index in range(len(test_cases))]
+    
+    for index, test_case in enumerate(test_cases):
         print(f"\n{'='*60}")
         print(f"Testing: {test_case['name']}")
         print(f"{'='*60}")
         
-        # Build dimension list
-        dimension_kv_list = []
-        for dim in test_case['dimensions']:
-            dimension_kv_list.extend([dim['name'], dim['value']])
+        print(f"\nWidget JSON:")
+        print(json.dumps(widgets[index], indent=2))
         
-        # Create widget JSON
-        widget = {
-            "width": 600,
-            "height": 400,
-            "metrics": [
-                [test_case['namespace'], test_case['metric_name']] + 
-                dimension_kv_list + 
-                [{"stat": test_case['statistic']}]
-            ],
-            "period": test_case['period'],
-            "start": "-PT24H",
-            "end": "PT0H",
-            "title": test_case['name'],
-            "view": "timeSeries",
-            "region": test_case['region'],
-            "timezone": "+0000"
-        }
+        if index in query_errors:
+            print(f"✗ Error: {query_errors[index]}")
+            continue
         
-        print(f"\nWidget JSON:")
-        print(json.dumps(widget, indent=2))
+        result = metric_results.get(f"q{index}", {"Timestamps": [], "Values": []})
+        datapoints = list(zip(result["Timestamps"], result["Values"]))
+        print(f"\n✓ Found {len(datapoints)} datapoints")
+        
+        if datapoints:
+            print(f"  Sample datapoint: {datapoints[0]}")
+        else:
+            print(f"  ⚠️ No data found - graph will be empty!")
         
-        # Try to get metric statistics to verify data exists
         try:
-            cloudwatch = boto3.client('cloudwatch', region_name=test_case['region'])
-            
-            dimension_list = []
-            for dim in test_case['dimensions']:
-                dimension_list.append({"Name": dim['name'], "Value": dim['value']})
-            
-            end_time = datetime.utcnow()
-            start_time = end_time - timedelta(hours=24)
-            
-            response = cloudwatch.get_metric_statistics(
-                Namespace=test_case['namespace'],
-                MetricName=test_case['metric_name'],
-                Dimensions=dimension_list,
-                StartTime=start_time,
-                EndTime=end_time,
-                Period=test_case['period'],
-                Statistics=[test_case['statistic']]
-            )
-            
-            datapoints = response.get('Datapoints', [])
-            print(f"\n✓ Found {len(datapoints)} datapoints")
-            
-            if datapoints:
-                print(f"  Sample datapoint: {datapoints[0]}")
-            else:
-                print(f"  ⚠️ No data found - graph will be empty!")
-            
-            # Try to generate the image
-            try:
-                image_response = cloudwatch.get_metric_widget_image(
-                    MetricWidget=json.dumps(widget)
-                )
-                print(f"✓ Successfully generated graph image ({len(image_response['MetricWidgetImage'])} bytes)")
-            except Exception as e:
-                print(f"✗ Failed to generate graph image: {e}")
-                
+            image_size = image_futures[index].result()
+            print(f"✓ Successfully generated graph image ({image_size} bytes)")
         except Exception as e:
-            print(f"✗ Error: {e}")
+            print(f"✗ Failed to generate graph image: {e}")
+
+def build_widget(test_case):
+    """
+    Build the GetMetricWidgetImage widget JSON for a test case
+    """
+    # Build dimension list
+    dimension_kv_list = []
+    for dim in test_case['dimensions']:
+        dimension_kv_list.extend([dim['name'], dim['value']])
+    
+    return {
+        "width": 600,
+        "height": 400,
+        "metrics": [
+            [test_case['namespace'], test_case['metric_name']] + 
+            dimension_kv_list + 
+            [{"stat": test_case['statistic']}]
+        ],
+        "period": test_case['period'],
+        "start": "-PT24H",
+        "end": "PT0H",
+        "title": test_case['name'],
+        "view": "timeSeries",
+        "region": test_case['region'],
+        "timezone": "+0000"
+    }
 
 def test_alarm_extraction():
     """
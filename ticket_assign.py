@@ -3,6 +3,7 @@ import json
 import logging
 import boto3
 import time
+from requests.adapters import HTTPAdapter
 from constants import CLIENT_ID, CLIENT_SECRET, REFRESH_TOKEN_TEAM, DevOps_TeamId, ENT_Linux_TeamId, SMB_Linux_TeamId, ENT_Windows_TeamId, SMB_Windows_TeamId, Database_TeamId, Uptime_TeamId, ORG_ID, REGION
 
 logger = logging.getLogger()
@@ -10,20 +11,42 @@ logger.setLevel(logging.INFO)
 
 SECRET_NAME = "zoho-automation-secrets"
 TOKEN_VALIDITY_SECONDS = 3600
+TOKEN_BUFFER_SECONDS = 60
+
+TEAM_MAP = {
+    "DevOps Team": DevOps_TeamId,
+    "Enterprise Linux Team": ENT_Linux_TeamId,
+    "SMB Linux Team": SMB_Linux_TeamId,
+    "Enterprise Windows Team": ENT_Windows_TeamId,
+    "SMB Windows Team": SMB_Windows_TeamId,
+    "Database Team": Database_TeamId,
+    "Uptime Team": Uptime_TeamId,
+}
+
+# Clients reused across warm invocations to keep connections to Zoho and AWS open
+_HTTP = requests.Session()
+_HTTP.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+_SM_CLIENT = boto3.client("secretsmanager", region_name=REGION)
+
+# In-memory copy of the team access token, reused across warm invocations
+_TOKEN_CACHE = {"token": None, "expiry": 0}
 
 def get_secret(secret_name=SECRET_NAME, region_name=REGION):
-    client = boto3.client("secretsmanager", region_name=region_name)
+    client = _SM_CLIENT if region_name == REGION else boto3.client("secretsmanager", region_name=region_name)
     response = client.get_secret_value(SecretId=secret_name)
     return json.loads(response["SecretString"])
 
 def update_secret(secret_name, updated_data, region_name=REGION):
-    client = boto3.client("secretsmanager", region_name=region_name)
+    client = _SM_CLIENT if region_name == REGION else boto3.client("secretsmanager", region_name=region_name)
     client.put_secret_value(
         SecretId=secret_name,
         SecretString=json.dumps(updated_data)
     )
 
 def get_access_token():
+    if _TOKEN_CACHE["token"] and time.time() < _TOKEN_CACHE["expiry"] - TOKEN_BUFFER_SECONDS:
+        return _TOKEN_CACHE["token"]
+
     logger.info("Retrieving access token from Secrets Manager...")
     secrets = get_secret()
 
@@ -33,6 +56,7 @@ def get_access_token():
 
     if access_token and expiry_time and current_time < expiry_time:
         logger.info("Using cached access token.")
+        _TOKEN_CACHE.update(token=access_token, expiry=expiry_time)
         return access_token
 
     logger.info("Access token missing or expired. Requesting new token from Zoho...")
@@ -46,7 +70,7 @@ def get_access_token():
     }
 
     try:
-        response = requests.post(token_url, params=params)
+        response = _HTTP.post(token_url, params=params)
         response.raise_for_status()
         new_token = response.json().get("access_token")
 
@@ -56,6 +80,7 @@ def get_access_token():
         secrets["ACCESS_TOKEN_TEAM"] = new_token
         secrets["ACCESS_TOKEN_TEAM_EXPIRY"] = current_time + TOKEN_VALIDITY_SECONDS
         update_secret(SECRET_NAME, secrets)
+        _TOKEN_CACHE.update(token=new_token, expiry=secrets["ACCESS_TOKEN_TEAM_EXPIRY"])
 
         logger.info("New access token retrieved and cached.")
         return new_token
@@ -68,17 +93,7 @@ def get_access_token():
 def assign_ticket_to_team(ticket_id, team_name):
     logger.info("Assigning ticket %s to team %s", ticket_id, team_name)
 
-    team_map = {
-        "DevOps Team": DevOps_TeamId,
-        "Enterprise Linux Team": ENT_Linux_TeamId,
-        "SMB Linux Team": SMB_Linux_TeamId,
-        "Enterprise Windows Team": ENT_Windows_TeamId,
-        "SMB Windows Team": SMB_Windows_TeamId,
-        "Database Team": Database_TeamId,
-        "Uptime Team": Uptime_TeamId,
-    }
-
-    team_id = team_map.get(team_name)
+    team_id = TEAM_MAP.get(team_name)
     if not team_id:
         logger.error("Unknown team name: %s", team_name)
         return {
@@ -107,7 +122,7 @@ def assign_ticket_to_team(ticket_id, team_name):
     }
 
     try:
-        response = requests.patch(url, headers=headers, json=payload)
+        response = _HTTP.patch(url, headers=headers, json=payload)
         response.raise_for_status()
         logger.info("Ticket successfully assigned to %s", team_name)
         return {
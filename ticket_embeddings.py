@@ -1,62 +1,46 @@
 import boto3
 import uuid
-import datetime
-from constants import EMBED_TABLE_NAME
-from boto3.dynamodb.conditions import Key, Attr
+import gzip
+import json
+import time
+from functools import lru_cache
+from constants import EMBED_TABLE_NAME, EMBED_BODY_BUCKET
+from shared_utils import utc_timestamp
 
-dynamodb = boto3.resource("dynamodb")
-table = dynamodb.Table(EMBED_TABLE_NAME)
+@lru_cache(maxsize=1)
+def _table():
+    # Built on first use rather than at import to keep cold starts short
+    return boto3.resource("dynamodb").Table(EMBED_TABLE_NAME)
 
-# Configuration
+@lru_cache(maxsize=1)
+def _s3():
+    return boto3.client("s3")
+
+# Configuration: items expire via DynamoDB TTL on the "ttl" attribute after this many days
 days_threshold = 365
 
-def delete_old_items():
-    """
-    Delete items older than the configured days_threshold (365 days).
+# Serialized responses larger than this go to S3 instead of the DynamoDB item.
+# ticketBody always stays inline so similarity search never has to read S3 to score.
+INLINE_RESPONSE_LIMIT = 4096
 
-    Returns:
-        dict: Status and count of deleted items
+def load_offloaded_body(item):
     """
-    try:
-        # Calculate cutoff date
-        cutoff_date = datetime.datetime.utcnow() - datetime.timedelta(days=days_threshold)
-        cutoff_timestamp = cutoff_date.isoformat()
-        
-        deleted_count = 0
-        
-        # Scan the table for old items
-        scan_kwargs = {
-            'FilterExpression': Attr('timestamp').lt(cutoff_timestamp)
-        }
-        
-        while True:
-            response = table.scan(**scan_kwargs)
-            items = response.get('Items', [])
-            
-            # Delete items in batch
-            with table.batch_writer() as batch:
-                for item in items:
-                    batch.delete_item(Key={'id': item['id']})
-                    deleted_count += 1
-            
-            # Check if there are more items to scan
-            if 'LastEvaluatedKey' not in response:
-                break
-            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
-        
-        return {
-            "status": "success", 
-            "deletedCount": deleted_count,
-            "cutoffDate": cutoff_timestamp
-        }
-        
-    except Exception as e:
-        return {"status": "error", "errorMessage": str(e)}
+    Return the item with its offloaded response restored from S3.
+    """
+    key = item.get("response_s3_key")
+    if not key:
+        return item
+    obj = _s3().get_object(Bucket=EMBED_BODY_BUCKET, Key=key)
+    item = {k: v for k, v in item.items() if k != "response_s3_key"}
+    item["response"] = json.loads(gzip.decompress(obj["Body"].read()))
+    return item
 
-def save_bedrock_response(ticket_id, ticket_subject, ticket_body, response_data, source="bedrock", auto_cleanup=True):
+def save_bedrock_response(ticket_id, ticket_subject, ticket_body, response_data, source="bedrock"):
     """
     Save ticket data and Bedrock response to DynamoDB.
-    Optionally performs cleanup of items older than 14 days.
+    Large responses are gzipped to S3 and the item keeps only a response_s3_key
+    pointer; the ticket body is always stored inline.
+    Old items are expired by DynamoDB TTL, so saving never scans or deletes.
     
     Args:
         ticket_id: ID of the ticket
@@ -64,34 +48,41 @@ def save_bedrock_response(ticket_id, ticket_subject, ticket_body, response_data,
         ticket_body: Body content of the ticket
         response_data: Response data from Bedrock
         source: Source identifier (default: "bedrock")
-        auto_cleanup: Whether to automatically clean up old items (default: True)
     
     Returns:
-        dict: Combined result of save and cleanup operations
+        dict: Result of the save operation
     """
     try:
+        item_id = str(uuid.uuid4())
+        now = time.time()
         item = {
-            "id": str(uuid.uuid4()),
+            "id": item_id,
             "ticketId": ticket_id,
             "ticketSubject": ticket_subject,
             "ticketBody": ticket_body,
             "response": response_data,
             "source": source,
-            "timestamp": datetime.datetime.utcnow().isoformat()
+            "timestamp": utc_timestamp(now),
+            # Epoch-seconds expiry for DynamoDB TTL on the "ttl" attribute
+            "ttl": int(now) + days_threshold * 86400
         }
-        table.put_item(Item=item)
         
-        save_result = {"status": "success", "savedItem": item}
+        payload = json.dumps(response_data, default=str)
+        if len(payload) > INLINE_RESPONSE_LIMIT:
+            response_key = f"{item_id}.json.gz"
+            _s3().put_object(
+                Bucket=EMBED_BODY_BUCKET,
+                Key=response_key,
+                Body=gzip.compress(payload.encode("utf-8")),
+                ContentType="application/json",
+                ContentEncoding="gzip"
+            )
+            del item["response"]
+            item["response_s3_key"] = response_key
         
-        # Perform cleanup if enabled
-        if auto_cleanup:
-            cleanup_result = delete_old_items()
-            return {
-                "save": save_result,
-                "cleanup": cleanup_result
-            }
+        _table().put_item(Item=item)
         
-        return save_result
+        return {"status": "success", "savedItem": item}
         
     except Exception as e:
         return {"status": "error", "errorMessage": str(e)}
\ No newline at end of file
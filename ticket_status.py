@@ -1,9 +1,14 @@
 import requests
-import json
+from requests.adapters import HTTPAdapter, Retry
 import logging
 import time
+import threading
 import boto3
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
 from constants import CLIENT_ID, CLIENT_SECRET, REFRESH_TOKEN, ORG_ID, REGION
+from shared_utils import json_loads, json_dumps
 
 # Logger configuration
 logger = logging.getLogger()
@@ -12,32 +17,97 @@ logger.setLevel(logging.INFO)
 # Constants
 SECRET_NAME = "zoho-automation-secrets"
 TOKEN_VALIDITY_SECONDS = 3600
+TOKEN_BUFFER_SECONDS = 60
+
+# In-memory copy of the access token, reused across warm invocations.
+# "expiry" is a time.monotonic() deadline with the refresh buffer already applied.
+_TOKEN_CACHE = {"token": None, "expiry": 0.0}
+_LOCK = threading.Lock()
+
+# Keep-alive connections and a pool large enough for bursts of AWS calls
+_CFG = Config(tcp_keepalive=True, max_pool_connections=50, retries={"max_attempts": 3, "mode": "standard"})
+
+# Module-level session so warm invocations reuse the TLS connections to Zoho
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+))
+
+@lru_cache(maxsize=None)
+def _sm_client(region_name):
+    """
+    One Secrets Manager client per region, reused across warm invocations.
+    """
+    return boto3.client(
+        "secretsmanager",
+        region_name=region_name,
+        config=_CFG
+    )
 
 def get_secret(secret_name=SECRET_NAME, region_name=REGION):
-    client = boto3.client("secretsmanager", region_name=region_name)
-    response = client.get_secret_value(SecretId=secret_name)
-    return json.loads(response["SecretString"])
+    response = _sm_client(region_name).get_secret_value(SecretId=secret_name)
+    return json_loads(response["SecretString"])
+
+def get_secrets(secret_names, region_name=REGION):
+    """
+    Fetch several secrets with BatchGetSecretValue instead of one call per name.
+    Returns a dict of secret name -> parsed JSON value.
+    """
+    # Deduplicate while keeping order; the API accepts up to 20 ids per call
+    names = list(dict.fromkeys(secret_names))
+    secrets = {}
+    for i in range(0, len(names), 20):
+        response = _sm_client(region_name).batch_get_secret_value(SecretIdList=names[i:i + 20])
+        for entry in response.get("SecretValues", []):
+            secrets[entry["Name"]] = json_loads(entry["SecretString"])
+        for error in response.get("Errors", []):
+            logger.warning("Failed to fetch secret %s: %s", error.get("SecretId"), error.get("Message"))
+    return secrets
 
 def update_secret(secret_name, updated_data, region_name=REGION):
-    client = boto3.client("secretsmanager", region_name=region_name)
-    client.put_secret_value(
+    _sm_client(region_name).put_secret_value(
         SecretId=secret_name,
-        SecretString=json.dumps(updated_data)
+        SecretString=json_dumps(updated_data)
     )
 
 def get_access_token():
     """
     Retrieve cached Zoho access token or fetch a new one if expired or missing.
+    The in-memory cache is checked first; Secrets Manager is only read on a miss.
     """
+    if time.monotonic() < _TOKEN_CACHE["expiry"]:
+        return _TOKEN_CACHE["token"]
+
+    with _LOCK:
+        # Another thread may have refreshed the token while we waited
+        if time.monotonic() < _TOKEN_CACHE["expiry"]:
+            return _TOKEN_CACHE["token"]
+        return _fetch_access_token()
+
+def _cache_token(token, expiry_epoch):
+    """
+    Store the token with its wall-clock expiry converted to a monotonic deadline.
+    """
+    _TOKEN_CACHE["token"] = token
+    _TOKEN_CACHE["expiry"] = time.monotonic() + (expiry_epoch - time.time()) - TOKEN_BUFFER_SECONDS
+
+def _fetch_access_token():
     logger.info("Retrieving access token from Secrets Manager...")
     secrets = get_secret()
 
     access_token = secrets.get("ACCESS_TOKEN")
-    expiry_time = secrets.get("ACCESS_TOKEN_EXPIRY")
+    # The stored expiry may come back as a string; normalize it once here
+    try:
+        expiry_time = int(secrets.get("ACCESS_TOKEN_EXPIRY") or 0)
+    except (TypeError, ValueError):
+        expiry_time = 0
     current_time = int(time.time())
 
     if access_token and expiry_time and current_time < expiry_time:
         logger.info("Using cached access token.")
+        _cache_token(access_token, expiry_time)
         return access_token
 
     logger.info("Access token missing or expired. Requesting new token from Zoho...")
@@ -50,7 +120,7 @@ def get_access_token():
         "refresh_token": REFRESH_TOKEN
     }
     try:
-        response = requests.post(token_url, params=params)
+        response = _SESSION.post(token_url, params=params)
         response.raise_for_status()
         new_token = response.json().get("access_token")
 
@@ -59,7 +129,10 @@ def get_access_token():
 
         secrets["ACCESS_TOKEN"] = new_token
         secrets["ACCESS_TOKEN_EXPIRY"] = current_time + TOKEN_VALIDITY_SECONDS
+        # Written even when Zoho returns the stored token: the new expiry is
+        # what stops other containers and modules from refreshing again
         update_secret(SECRET_NAME, secrets)
+        _cache_token(new_token, secrets["ACCESS_TOKEN_EXPIRY"])
 
         logger.info("New access token retrieved and cached.")
         return new_token
@@ -68,20 +141,7 @@ def get_access_token():
         logger.error("Failed to retrieve access token: %s", str(e))
         raise Exception(f"Failed to retrieve access token: {str(e)}")
 
-def update_ticket_status(ticket_id):
-    """
-    Updates the status of a Zoho Desk ticket to 'Assigned'.
-    """
-    if not ticket_id:
-        logger.warning("Missing 'ticket_id'.")
-        return {"error": "Missing ticket_id"}
-
-    try:
-        access_token = get_access_token()
-        logger.info("Access token retrieved successfully.")
-    except Exception as e:
-        return {"error": str(e)}
-
+def _patch_ticket_status(ticket_id, access_token):
     url = f"https://desk.zoho.com/api/v1/tickets/{ticket_id}"
     headers = {
         "Authorization": f"Zoho-oauthtoken {access_token}",
@@ -95,7 +155,7 @@ def update_ticket_status(ticket_id):
     logger.info("Updating ticket ID %s to status 'Assigned'...", ticket_id)
 
     try:
-        response = requests.patch(url, headers=headers, json=payload)
+        response = _SESSION.patch(url, headers=headers, json=payload)
         response.raise_for_status()
         logger.info("Ticket status updated successfully.")
         return response.json()
@@ -103,3 +163,39 @@ def update_ticket_status(ticket_id):
     except requests.RequestException as e:
         logger.error("Error updating ticket status: %s", str(e))
         return {"error": str(e)}
+
+def update_ticket_status(ticket_id):
+    """
+    Updates the status of a Zoho Desk ticket to 'Assigned'.
+    """
+    if not ticket_id:
+        logger.warning("Missing 'ticket_id'.")
+        return {"error": "Missing ticket_id"}
+
+    try:
+        access_token = get_access_token()
+        logger.info("Access token retrieved successfully.")
+    except Exception as e:
+        return {"error": str(e)}
+
+    return _patch_ticket_status(ticket_id, access_token)
+
+def update_ticket_statuses(ticket_ids, max_workers=10):
+    """
+    Updates several Zoho Desk tickets to 'Assigned' concurrently.
+    Returns a dict of ticket_id -> Zoho response (or error dict).
+    """
+    ticket_ids = [ticket_id for ticket_id in dict.fromkeys(ticket_ids) if ticket_id]
+    if not ticket_ids:
+        return {}
+
+    try:
+        access_token = get_access_token()
+        logger.info("Access token retrieved successfully.")
+    except Exception as e:
+        return {ticket_id: {"error": str(e)} for ticket_id in ticket_ids}
+
+    # PATCHes overlap on the shared session's connection pool
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(ticket_ids))) as executor:
+        results = executor.map(lambda ticket_id: _patch_ticket_status(ticket_id, access_token), ticket_ids)
+        return dict(zip(ticket_ids, results))
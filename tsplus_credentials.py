@@ -2,33 +2,61 @@ import json
 import logging
 import boto3
 import re
+import time
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from datetime import datetime, timedelta
-from first_response import send_email_reply
+from first_response import send_email_reply, get_access_token
+from shared_utils import json_loads
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Keep-alive connections and a pool large enough for presign/API bursts
+_CFG = Config(tcp_keepalive=True, max_pool_connections=50, retries={"max_attempts": 3, "mode": "standard"})
+
+@lru_cache(maxsize=1)
+def _s3_client():
+    """
+    S3 client reused across warm invocations.
+    """
+    return boto3.client('s3', config=_CFG)
+
+# Marker-delimited S3 objects JSON in SSM output; bytes and str variants so
+# raw command output (bytes, mmap, memoryview) can be searched in place
+_S3_MARKER_RE = re.compile(rb"S3_OBJECTS_JSON_START(.*?)S3_OBJECTS_JSON_END", re.DOTALL)
+_S3_MARKER_STR_RE = re.compile(r"S3_OBJECTS_JSON_START(.*?)S3_OBJECTS_JSON_END", re.DOTALL)
+
 def extract_s3_objects_from_ssm_output(ssm_output):
     """
     Extract S3 objects JSON from SSM command output.
+    Accepts a str or any bytes-like buffer; an mmap of a large output file is
+    searched in place and only the matched JSON slice is copied.
+    Output combined from several commands may hold several marker blocks;
+    their object lists are concatenated.
     """
     try:
-        # Look for S3_OBJECTS_JSON_START and S3_OBJECTS_JSON_END markers
-        start_marker = "S3_OBJECTS_JSON_START"
-        end_marker = "S3_OBJECTS_JSON_END"
-        
         if not ssm_output:
             logger.warning("No SSM output provided")
             return []
         
-        start_index = ssm_output.find(start_marker)
-        end_index = ssm_output.find(end_marker)
+        # Look for S3_OBJECTS_JSON_START and S3_OBJECTS_JSON_END markers in one pass,
+        # skipping the regex entirely when the start marker isn't there
+        if isinstance(ssm_output, str):
+            matches = "S3_OBJECTS_JSON_START" in ssm_output and list(_S3_MARKER_STR_RE.finditer(ssm_output))
+        elif isinstance(ssm_output, (bytes, bytearray)):
+            matches = b"S3_OBJECTS_JSON_START" in ssm_output and list(_S3_MARKER_RE.finditer(ssm_output))
+        else:
+            matches = list(_S3_MARKER_RE.finditer(ssm_output))
         
-        if start_index != -1 and end_index != -1:
-            start_index += len(start_marker)
-            json_str = ssm_output[start_index:end_index].strip()
-            s3_objects = json.loads(json_str)
+        if matches:
+            blocks = [json_loads(match.group(1).strip()) for match in matches]
+            if len(blocks) == 1:
+                s3_objects = blocks[0]
+            else:
+                s3_objects = [obj for block in blocks for obj in (block if isinstance(block, list) else [block])]
             logger.info(f"Successfully extracted {len(s3_objects)} S3 objects from SSM output")
             return s3_objects
         else:
@@ -41,52 +69,128 @@ def extract_s3_objects_from_ssm_output(ssm_output):
         logger.error(f"Error extracting S3 objects from SSM output: {str(e)}")
         return []
 
+@lru_cache(maxsize=1024)
+def _presign(bucket_name, s3_key, expires_in, hour_bucket):
+    """
+    Sign a GetObject URL. hour_bucket is part of the cache key only, so a retry
+    or resend within the same hour reuses the URL instead of signing again.
+    """
+    return _s3_client().generate_presigned_url(
+        'get_object',
+        Params={'Bucket': bucket_name, 'Key': s3_key},
+        ExpiresIn=expires_in
+    )
+
+def _presign_one(obj, expiration_hours):
+    """
+    Generate the presigned URL entry for one S3 object, or None if it can't be signed.
+    """
+    try:
+        bucket_name = obj.get('S3Bucket')
+        s3_key = obj.get('S3Key')
+        username = obj.get('Username')
+        
+        if not bucket_name or not s3_key or not username:
+            logger.warning(f"Missing required fields in S3 object: {obj}")
+            return None
+        
+        # Generate presigned URL (hours converted to seconds)
+        presigned_url = _presign(bucket_name, s3_key, expiration_hours * 3600, int(time.time() // 3600))
+        
+        logger.debug("Generated presigned URL for %s: %s", username, s3_key)
+        
+        return {
+            'Username': username,
+            'S3Key': s3_key,
+            'S3Bucket': bucket_name,
+            'PresignedURL': presigned_url,
+            'ExpiresIn': f"{expiration_hours} hours"
+        }
+        
+    except ClientError as e:
+        logger.error(f"Error generating presigned URL for {obj.get('Username', 'unknown')}: {str(e)}")
+    except Exception as e:
+        logger.error(f"Unexpected error generating presigned URL: {str(e)}")
+    return None
+
 def generate_presigned_urls(s3_objects, expiration_hours=24):
     """
-    Generate presigned URLs for S3 objects.
+    Generate presigned URLs for S3 objects, signing them concurrently.
     """
     if not s3_objects:
         logger.info("No S3 objects to generate presigned URLs for")
         return []
     
-    s3_client = boto3.client('s3')
-    presigned_urls = []
-    
-    for obj in s3_objects:
-        try:
-            bucket_name = obj.get('S3Bucket')
-            s3_key = obj.get('S3Key')
-            username = obj.get('Username')
-            
-            if not bucket_name or not s3_key or not username:
-                logger.warning(f"Missing required fields in S3 object: {obj}")
-                continue
-            
-            # Generate presigned URL
-            presigned_url = s3_client.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': bucket_name, 'Key': s3_key},
-                ExpiresIn=expiration_hours * 3600  # Convert hours to seconds
-            )
-            
-            presigned_urls.append({
-                'Username': username,
-                'S3Key': s3_key,
-                'S3Bucket': bucket_name,
-                'PresignedURL': presigned_url,
-                'ExpiresIn': f"{expiration_hours} hours"
-            })
-            
-            logger.info(f"Generated presigned URL for {username}: {s3_key}")
-            
-        except ClientError as e:
-            logger.error(f"Error generating presigned URL for {obj.get('Username', 'unknown')}: {str(e)}")
-        except Exception as e:
-            logger.error(f"Unexpected error generating presigned URL: {str(e)}")
+    with ThreadPoolExecutor(max_workers=min(16, len(s3_objects))) as executor:
+        results = executor.map(lambda obj: _presign_one(obj, expiration_hours), s3_objects)
+        presigned_urls = [result for result in results if result]
     
     logger.info(f"Successfully generated {len(presigned_urls)} presigned URLs")
     return presigned_urls
 
+# Credentials table row templates; the download column variant is picked once per table
+_ROW_TPL = "<tr><td>{Username}</td><td>{Password}</td><td>{Groups}</td><td>{ServerIP}</td></tr>"
+_ROW_WITH_LINK_TPL = (
+    "<tr><td>{Username}</td><td>{Password}</td><td>{Groups}</td><td>{ServerIP}</td>"
+    "<td style='text-align: center;'>{Download}</td></tr>"
+)
+_DOWNLOAD_LINK_TPL = (
+    "<a href='{PresignedURL}' "
+    "style='color: #007bff; text-decoration: none; font-weight: bold;' "
+    "target='_blank' download='{Username}.connect'>"
+    "📥 Download</a><br/>"
+    "<small style='color: #666; font-size: 11px;'>"
+    "Expires in {ExpiresIn}</small>"
+)
+_DOWNLOAD_MISSING_HTML = "<span style='color: #999;'>Not Available</span>"
+
+# Info boxes appended after the credentials table
+_DOWNLOAD_INSTRUCTIONS_HTML = (
+    "<br/><div style='background-color: #f8f9fa; padding: 15px; border-left: 4px solid #007bff; margin: 20px 0;'>"
+    "<h3 style='color: #007bff; margin-top: 0;'>📁 Download Instructions:</h3>"
+    "<ol style='margin: 10px 0; padding-left: 20px;'>"
+    "<li>Click the <strong>📥 Download</strong> link for each user to download their .connect file</li>"
+    "<li>Save the .connect file to your local machine</li>"
+    "<li>Double-click the .connect file to launch TSPlus connection</li>"
+    "<li><strong>Important:</strong> Download links are valid for 24 hours only</li>"
+    "</ol>"
+    "<p style='margin: 10px 0; font-size: 12px; color: #666;'>"
+    "💡 <strong>Tip:</strong> Right-click the download link and select 'Save Link As' to specify the download location."
+    "</p>"
+    "</div>"
+)
+_NO_S3_HTML = (
+    "<br/><div style='background-color: #fff3cd; padding: 15px; border-left: 4px solid #ffc107; margin: 20px 0;'>"
+    "<h3 style='color: #856404; margin-top: 0;'>📝 Connection Files:</h3>"
+    "<p style='margin: 10px 0; color: #856404;'>"
+    "TSPlus .connect files have been created on the server. Please contact your system administrator to access them."
+    "</p>"
+    "</div>"
+)
+
+class _RowFields(dict):
+    """
+    Template fields for one row; absent credential fields render as empty strings.
+    """
+    def __missing__(self, key):
+        return ''
+
+def _row_fields(cred, url_lookup):
+    """
+    Build the template fields for one credentials row, including the download cell when links exist.
+    """
+    fields = _RowFields(cred)
+    if url_lookup:
+        url_info = url_lookup.get(fields['Username'])
+        fields['Download'] = (
+            _DOWNLOAD_LINK_TPL.format(
+                PresignedURL=url_info['PresignedURL'],
+                Username=fields['Username'],
+                ExpiresIn=url_info['ExpiresIn']
+            ) if url_info else _DOWNLOAD_MISSING_HTML
+        )
+    return fields
+
 def build_credentials_html(response_data, presigned_urls=None):
     """
     Builds an HTML table with user credentials and download links from the response data.
@@ -97,9 +201,8 @@ def build_credentials_html(response_data, presigned_urls=None):
         return "<p><strong>No TSPlus user credentials found in the response.</strong></p>"
 
     # Create a lookup dictionary for presigned URLs
-    url_lookup = {}
-    if presigned_urls:
-        url_lookup = {url['Username']: url for url in presigned_urls}
+    url_lookup = {url['Username']: url for url in presigned_urls} if presigned_urls else {}
+    if url_lookup:
         logger.info(f"Created URL lookup for {len(url_lookup)} users")
 
     # Determine if we have download links
@@ -117,69 +220,12 @@ def build_credentials_html(response_data, presigned_urls=None):
         html_content.append("<th>Download .connect File</th>")
     
     html_content.append("</tr>")
-
-    for cred in user_creds:
-        username = cred.get('Username', '')
-        password = cred.get('Password', '')
-        groups = cred.get('Groups', '')
-        server_ip = cred.get('ServerIP', '')
-        
-        html_content.append(
-            f"<tr>"
-            f"<td>{username}</td>"
-            f"<td>{password}</td>"
-            f"<td>{groups}</td>"
-            f"<td>{server_ip}</td>"
-        )
-        
-        # Add download link if available
-        if has_download_links:
-            if username in url_lookup:
-                presigned_url = url_lookup[username]['PresignedURL']
-                expires_in = url_lookup[username]['ExpiresIn']
-                download_link = (
-                    f"<a href='{presigned_url}' "
-                    f"style='color: #007bff; text-decoration: none; font-weight: bold;' "
-                    f"target='_blank' download='{username}.connect'>"
-                    f"📥 Download</a><br/>"
-                    f"<small style='color: #666; font-size: 11px;'>"
-                    f"Expires in {expires_in}</small>"
-                )
-            else:
-                download_link = "<span style='color: #999;'>Not Available</span>"
-            
-            html_content.append(f"<td style='text-align: center;'>{download_link}</td>")
-        
-        html_content.append("</tr>")
-    
+    row_tpl = _ROW_WITH_LINK_TPL if has_download_links else _ROW_TPL
+    html_content.append("".join(row_tpl.format_map(_row_fields(cred, url_lookup)) for cred in user_creds))
     html_content.append("</table>")
     
-    # Add download instructions if we have download links
-    if has_download_links:
-        html_content.extend([
-            "<br/><div style='background-color: #f8f9fa; padding: 15px; border-left: 4px solid #007bff; margin: 20px 0;'>",
-            "<h3 style='color: #007bff; margin-top: 0;'>📁 Download Instructions:</h3>",
-            "<ol style='margin: 10px 0; padding-left: 20px;'>",
-            "<li>Click the <strong>📥 Download</strong> link for each user to download their .connect file</li>",
-            "<li>Save the .connect file to your local machine</li>", 
-            "<li>Double-click the .connect file to launch TSPlus connection</li>",
-            "<li><strong>Important:</strong> Download links are valid for 24 hours only</li>",
-            "</ol>",
-            "<p style='margin: 10px 0; font-size: 12px; color: #666;'>",
-            "💡 <strong>Tip:</strong> Right-click the download link and select 'Save Link As' to specify the download location.",
-            "</p>",
-            "</div>"
-        ])
-    else:
-        # Add note about manual file access if no S3 links
-        html_content.extend([
-            "<br/><div style='background-color: #fff3cd; padding: 15px; border-left: 4px solid #ffc107; margin: 20px 0;'>",
-            "<h3 style='color: #856404; margin-top: 0;'>📝 Connection Files:</h3>",
-            "<p style='margin: 10px 0; color: #856404;'>",
-            "TSPlus .connect files have been created on the server. Please contact your system administrator to access them.",
-            "</p>",
-            "</div>"
-        ])
+    # Add download instructions if we have download links, otherwise a note about manual file access
+    html_content.append(_DOWNLOAD_INSTRUCTIONS_HTML if has_download_links else _NO_S3_HTML)
     
     return "".join(html_content)
 
@@ -191,72 +237,16 @@ def send_tsplus_credentials(ticket_id, from_emails, to_emails, cc_emails, respon
     try:
         logger.info("Preparing TSPlus credentials email for ticket ID: %s", ticket_id)
 
-        # Extract S3 objects from SSM output if provided
-        s3_objects = []
-        presigned_urls = []
-        
-        if ssm_output:
-            logger.info("Processing SSM output for S3 objects")
-            s3_objects = extract_s3_objects_from_ssm_output(ssm_output)
-            
-            if s3_objects:
-                logger.info(f"Found {len(s3_objects)} S3 objects, generating presigned URLs")
-                presigned_urls = generate_presigned_urls(s3_objects, expiration_hours=24)
-            else:
-                logger.info("No S3 objects found in SSM output")
-        else:
-            logger.info("No SSM output provided, skipping S3 processing")
-
-        # Build HTML content with or without download links
-        credentials_html = build_credentials_html(response_data, presigned_urls)
-        server_name = response_data.get("ServerName", "Unknown Server")
-        
-        # Check S3 configuration status
-        s3_config = response_data.get("S3Configuration", {})
-        s3_enabled = s3_config.get("Enabled", False)
-
-        # Build email body
-        email_body = (
-            "<body style='font-family: Arial, sans-serif; font-size: 14px; color: #333;'>"
-            "<p>Dear Sir/Ma'am,</p>"
-            "<p>Greetings from <strong>Workmates Support</strong>! We hope this email finds you well.</p>"
-
-            f"<p>✅ The TSPlus users have been created successfully on server <strong>{server_name}</strong>.</p>"
-            
-            f"{credentials_html}"
-        )
-        
-        # Add S3 information if files were uploaded
-        if presigned_urls:
-            email_body += (
-                "<br/><div style='background-color: #d4edda; padding: 15px; border-left: 4px solid #28a745; margin: 20px 0;'>"
-                "<h3 style='color: #155724; margin-top: 0;'>🔒 Security Information</h3>"
-                "<p style='margin: 10px 0; color: #155724;'>"
-                f"Your TSPlus .connect files have been securely uploaded to our cloud storage. "
-                f"Download links are valid for <strong>24 hours</strong> and will expire automatically for security."
-                "</p>"
-                "</div>"
-            )
-        elif s3_enabled:
-            # S3 was configured but no files were uploaded
-            email_body += (
-                "<br/><div style='background-color: #fff3cd; padding: 15px; border-left: 4px solid #ffc107; margin: 20px 0;'>"
-                "<h3 style='color: #856404; margin-top: 0;'>⚠️ File Upload Status</h3>"
-                "<p style='margin: 10px 0; color: #856404;'>"
-                "Cloud storage was configured but .connect files may not have been uploaded successfully. "
-                "Please check the server logs or contact support if you need assistance accessing the files."
-                "</p>"
-                "</div>"
-            )
-        
-        email_body += (
-            "<p>Thank you,<br/><br/>"
-            "<strong>Best Regards</strong><br/>"
-            "<img src='https://zoho-uptime-automation-assets-bucket.s3.ap-south-1.amazonaws.com/Workmates-Logo.png' "
-            "alt='Workmates Logo' style='margin-top:10px; width:150px;'/>"
-            "<br/>Workmates Support<br/></p>"
-            "</body>"
-        )
+        # Fetch the Zoho token in the background while the email body is prepared
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            token_future = executor.submit(get_access_token)
+            email_body, s3_objects, presigned_urls, s3_enabled = _build_email_body(response_data, ssm_output)
+            try:
+                access_token = token_future.result()
+            except Exception as e:
+                # send_email_reply retries the fetch and reports the error
+                logger.warning("Background access token fetch failed: %s", str(e))
+                access_token = None
 
         logger.info("Sending TSPlus credentials email with reply text length: %s", len(email_body))
 
@@ -265,7 +255,8 @@ def send_tsplus_credentials(ticket_id, from_emails, to_emails, cc_emails, respon
             from_emails=from_emails,
             to_emails=to_emails,
             cc_emails=cc_emails,
-            reply_text=email_body
+            reply_text=email_body,
+            access_token=access_token
         )
 
         logger.info("send_email_reply response: %s", response)
@@ -287,6 +278,80 @@ def send_tsplus_credentials(ticket_id, from_emails, to_emails, cc_emails, respon
             "body": json.dumps({"error": f"Error sending credentials email: {str(e)}"})
         }
 
+def _build_email_body(response_data, ssm_output):
+    """
+    Build the credentials email body, presigning .connect file links found in the SSM output.
+    Returns (email_body, s3_objects, presigned_urls, s3_enabled).
+    """
+    # Extract S3 objects from SSM output if provided
+    s3_objects = []
+    presigned_urls = []
+    
+    if ssm_output:
+        logger.info("Processing SSM output for S3 objects")
+        s3_objects = extract_s3_objects_from_ssm_output(ssm_output)
+        
+        if s3_objects:
+            logger.info(f"Found {len(s3_objects)} S3 objects, generating presigned URLs")
+            presigned_urls = generate_presigned_urls(s3_objects, expiration_hours=24)
+        else:
+            logger.info("No S3 objects found in SSM output")
+    else:
+        logger.info("No SSM output provided, skipping S3 processing")
+
+    # Build HTML content with or without download links
+    credentials_html = build_credentials_html(response_data, presigned_urls)
+    server_name = response_data.get("ServerName", "Unknown Server")
+    
+    # Check S3 configuration status
+    s3_config = response_data.get("S3Configuration", {})
+    s3_enabled = s3_config.get("Enabled", False)
+
+    # Build email body
+    email_body = (
+        "<body style='font-family: Arial, sans-serif; font-size: 14px; color: #333;'>"
+        "<p>Dear Sir/Ma'am,</p>"
+        "<p>Greetings from <strong>Workmates Support</strong>! We hope this email finds you well.</p>"
+
+        f"<p>✅ The TSPlus users have been created successfully on server <strong>{server_name}</strong>.</p>"
+        
+        f"{credentials_html}"
+    )
+    
+    # Add S3 information if files were uploaded
+    if presigned_urls:
+        email_body += (
+            "<br/><div style='background-color: #d4edda; padding: 15px; border-left: 4px solid #28a745; margin: 20px 0;'>"
+            "<h3 style='color: #155724; margin-top: 0;'>🔒 Security Information</h3>"
+            "<p style='margin: 10px 0; color: #155724;'>"
+            f"Your TSPlus .connect files have been securely uploaded to our cloud storage. "
+            f"Download links are valid for <strong>24 hours</strong> and will expire automatically for security."
+            "</p>"
+            "</div>"
+        )
+    elif s3_enabled:
+        # S3 was configured but no files were uploaded
+        email_body += (
+            "<br/><div style='background-color: #fff3cd; padding: 15px; border-left: 4px solid #ffc107; margin: 20px 0;'>"
+            "<h3 style='color: #856404; margin-top: 0;'>⚠️ File Upload Status</h3>"
+            "<p style='margin: 10px 0; color: #856404;'>"
+            "Cloud storage was configured but .connect files may not have been uploaded successfully. "
+            "Please check the server logs or contact support if you need assistance accessing the files."
+            "</p>"
+            "</div>"
+        )
+    
+    email_body += (
+        "<p>Thank you,<br/><br/>"
+        "<strong>Best Regards</strong><br/>"
+        "<img src='https://zoho-uptime-automation-assets-bucket.s3.ap-south-1.amazonaws.com/Workmates-Logo.png' "
+        "alt='Workmates Logo' style='margin-top:10px; width:150px;'/>"
+        "<br/>Workmates Support<br/></p>"
+        "</body>"
+    )
+
+    return email_body, s3_objects, presigned_urls, s3_enabled
+
 # Backward compatibility - keep original function signature
 def send_tsplus_credentials_legacy(ticket_id, from_emails, to_emails, cc_emails, response_data):
     """
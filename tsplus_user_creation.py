@@ -1,27 +1,59 @@
 import boto3
-import botocore
 import os
 import json
-import base64
+import hashlib
 import re
-import random
+import secrets
 import string
 import time
+import types
 import logging
 from datetime import datetime
-from botocore.exceptions import ClientError
-from rapidfuzz import fuzz
-from cross_account_role import assume_role
-from constants import ACCOUNT_TABLE_NAME
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from botocore.exceptions import ClientError, WaiterError
+from boto3.dynamodb.conditions import Attr
+from constants import ACCOUNT_TABLE_NAME, ACCOUNT_EMAIL_TABLE_NAME
 from create_rdp_user_connect_profile import SSM_DOCUMENT_NAME, SSM_DOCUMENT_CONTENT
 from constants import REGION, MODEL_ID
+from shared_utils import json_loads, json_dumps
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-dynamodb = boto3.resource('dynamodb')
-account_table = dynamodb.Table(ACCOUNT_TABLE_NAME)
+# User-creation settings from the Lambda environment; fixed for the container's lifetime
+ENV = types.SimpleNamespace(
+    common_groups=os.getenv("CommonGroups", ""),
+    must_change=os.getenv("UserMustChange", ""),
+    can_change=os.getenv("UserCanChange", ""),
+    never_expires=os.getenv("PasswordNeverExpires", ""),
+    disabled=os.getenv("AccountDisabled", ""),
+    display_mode=os.getenv("DisplayMode", ""),
+    printer_action=os.getenv("PrinterAction", ""),
+    printer_scale=os.getenv("PrinterScale", ""),
+    s3_bucket_name=os.getenv("S3_BUCKET_NAME"),
+    s3_prefix=os.getenv("S3_PREFIX", "tsplus-connect-files"),
+)
+
+@lru_cache(maxsize=1)
+def _account_table():
+    """
+    Account details table, created on first use and reused across warm invocations.
+    """
+    return boto3.resource('dynamodb').Table(ACCOUNT_TABLE_NAME)
+
+@lru_cache(maxsize=1)
+def _account_email_table():
+    """
+    Customer email -> AccountId lookup table (partition key EmailIdLower), or None
+    when ACCOUNT_EMAIL_TABLE_NAME is not configured. Kept separate from the account
+    table because that one is keyed on AccountId alone and cannot hold a row per email.
+    """
+    if not ACCOUNT_EMAIL_TABLE_NAME:
+        return None
+    return boto3.resource('dynamodb').Table(ACCOUNT_EMAIL_TABLE_NAME)
 
 region_map = {
     "Mumbai": "ap-south-1", "Hyderabad": "ap-south-2", "Osaka": "ap-northeast-3", "Seoul": "ap-northeast-2",
@@ -31,8 +63,18 @@ region_map = {
     "Stockholm": "eu-north-1", "São Paulo": "sa-east-1"
 }
 
-session = boto3.Session(region_name=REGION)
-bedrock_runtime = session.client("bedrock-runtime")
+@lru_cache(maxsize=1)
+def _bedrock():
+    """
+    Bedrock runtime client, created on first use so invocations that never reach
+    the model (cached parses, account lookups) don't pay for loading it.
+    """
+    return boto3.Session(region_name=REGION).client("bedrock-runtime")
+
+# Successful Bedrock parses keyed by a hash of the normalized ticket body,
+# reused across warm invocations for repeated/re-sent tickets
+PARSE_CACHE_SIZE = 256
+_parse_cache = OrderedDict()
 
 SYSTEM_PROMPT = (
     "You are an expert IT automation assistant specializing in RDP user creation requests. "
@@ -92,9 +134,65 @@ SYSTEM_PROMPT = (
     "✓ No extra text outside JSON block"
 )
 
+# Regex fallback patterns, compiled once at import
+_EMAIL_RE = re.compile(r'<([^>]+)>|([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})')
+_NEWLINES_RE = re.compile(r'\n+')
+_SIGN_OFF_RE = re.compile(r'(Regards,|Thanks,|Best,|Sincerely,).*$', re.IGNORECASE | re.DOTALL)
+_SERVER_KEYWORDS = ("server named", "server is", "server:")
+_SERVER_RES = tuple(re.compile(p, re.IGNORECASE) for p in (
+    r"server named ([^\s:,;.!?]+)",
+    r"server is ([^\s:,;.!?]+)",
+    r"server[:\s]+([^\s;,]+)",
+    r"on server ([^\s:,;.!?]+)",
+    r"server\s*=\s*([^\s,;:.]+)",
+))
+_USER_BLOCK_RE = re.compile(r"(?:create|following).*?users.*?:([\s\S]+?)(?:assign|map|to|$)", re.IGNORECASE)
+_NON_USERNAME_CHARS_RE = re.compile(r'[^\w\-_.@]')
+# Username candidates: drop stray characters (but not separators) first, then
+# every run of 3+ username characters is one token
+_NON_TOKEN_CHARS_RE = re.compile(r'[^\w\-_.@,;\s]')
+_USERNAME_TOKEN_RE = re.compile(r'[\w\-_.@]{3,}')
+_USERNAME_STOPWORDS = frozenset({
+    'could', 'you', 'the', 'rdp', 'server', 'named', 'create', 'following',
+    'users', 'assign', 'group', 'groups', 'also', 'all', 'three', 'and', 'to', 'be',
+    'on', 'please', 'kindly', 'should', 'with', 'team', 'for', 'request'
+})
+_GROUP_KEYWORDS = ("assign", "map", "should be assigned", "add", "give access")
+# Every server pattern needs "server" and every group pattern needs one of these
+# words, so lines without them are skipped before any fuzzy scoring
+_GROUP_REQUIRED_WORDS = ("group", "role", "access")
+# (pattern, groups captured before users)
+_GROUP_RES = tuple((re.compile(p, re.IGNORECASE), "assign" in p and "to" in p) for p in (
+    r"assign (.*?) (?:group|role|access) to (.*?)(?:\s+and|\s*,|\s*$)",
+    r"(.*?) should be assigned to (.*?) (?:group|role|access)",
+    r"(.*?) assigned to (.*?) (?:group|role|access)",
+    r"give (.*?) access to (.*?) (?:group|role)",
+    r"add (.*?) to (.*?) (?:group|role|access)",
+    r"(.*?)[:\s]+(.*?) (?:group|role|access)",
+))
+_GROUP_PREFIX_RE = re.compile(r'^(also|please|kindly)\s+', re.IGNORECASE)
+_LIST_SPLIT_RE = re.compile(r'\s+and\s+|,\s*|;')
+_TRAILING_PUNCT_RE = re.compile(r'[\s\.,;]+$')
+
+def _has_keyword(line_lower, keywords):
+    """
+    True if the line contains a keyword or fuzzily matches one (partial_ratio > 80).
+    An exact substring always scores 100, so the `in` test only skips RapidFuzz.
+    """
+    if any(kw in line_lower for kw in keywords):
+        return True
+    # RapidFuzz is only needed on the regex fallback path; import it on first use
+    from rapidfuzz import fuzz, process
+    # One call scores every keyword; the cutoff is inclusive, so keep the strict > 80
+    best = process.extractOne(line_lower, keywords, scorer=fuzz.partial_ratio, score_cutoff=80)
+    return best is not None and best[1] > 80
+
+_PASSWORD_CHARS = string.ascii_letters + string.digits + "!@#$%^&*()"
+_SYSTEM_RANDOM = secrets.SystemRandom()
+
 def generate_password(length=10):
-    characters = string.ascii_letters + string.digits + "!@#$%^&*()"
-    return ''.join(random.choice(characters) for _ in range(length))
+    # OS entropy, and one choices() call instead of a choice() per character
+    return ''.join(_SYSTEM_RANDOM.choices(_PASSWORD_CHARS, k=length))
 
 
 def extract_email_address(email_input):
@@ -122,8 +220,7 @@ def extract_email_address(email_input):
     cleaned = email_string.strip('[]"\'')
     
     # Extract email using regex - look for email pattern inside angle brackets or standalone
-    email_pattern = r'<([^>]+)>|([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})'
-    match = re.search(email_pattern, cleaned)
+    match = _EMAIL_RE.search(cleaned)
     
     if match:
         # Return the email from angle brackets or the standalone email
@@ -131,9 +228,59 @@ def extract_email_address(email_input):
     
     return None
 
+_JSON_DECODER = json.JSONDecoder()
+
+def _read_streamed_json(stream):
+    """
+    Accumulate text deltas from a Bedrock response stream and stop as soon as
+    they contain one complete JSON object. Returns (text, parsed) where parsed
+    is None if the stream ended without a complete object.
+    """
+    parts = []
+    try:
+        for event in stream:
+            chunk = event.get("chunk")
+            if not chunk:
+                continue
+            data = json_loads(chunk["bytes"])
+            if data.get("type") != "content_block_delta":
+                continue
+            text = data["delta"].get("text", "")
+            parts.append(text)
+            if "}" in text:
+                model_text = "".join(parts)
+                start = model_text.find("{")
+                if start != -1:
+                    try:
+                        parsed, _ = _JSON_DECODER.raw_decode(model_text, start)
+                        return model_text, parsed
+                    except json.JSONDecodeError:
+                        pass
+    finally:
+        # Stop receiving the rest of the generation once we have what we need
+        close = getattr(stream, "close", None)
+        if close:
+            close()
+    return "".join(parts), None
+
+def _parse_cache_key(ticket_body):
+    """
+    Hash of the ticket body with line endings and blank lines normalized.
+    """
+    normalized = ticket_body.replace('\r\n', '\n').replace('\r', '\n')
+    normalized = _NEWLINES_RE.sub('\n', normalized).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+def _cache_parse_result(cache_key, server_name, usernames, group_map):
+    _parse_cache[cache_key] = (server_name, list(usernames), dict(group_map))
+    _parse_cache.move_to_end(cache_key)
+    if len(_parse_cache) > PARSE_CACHE_SIZE:
+        _parse_cache.popitem(last=False)
+
 def parse_ticket_for_tsplus(ticket_body):
     """
     Parses the ticket body for TSPlus details.
+    0) Returns a cached Claude result if the same ticket body was parsed before.
     1) First tries Claude Sonnet 4 via Bedrock.
     2) Falls back to regex-based extraction with RapidFuzz if Claude fails.
     Returns: server_name, usernames list, and group_map dict.
@@ -141,38 +288,57 @@ def parse_ticket_for_tsplus(ticket_body):
     inference_profile_arn = MODEL_ID
     max_retries = 3
     retry_delay_seconds = 2
-    max_tokens = 25000
+    # The JSON answer is small; this cap only guards against runaway output
+    max_tokens = 2048
+
+    cache_key = _parse_cache_key(ticket_body)
+    cached = _parse_cache.get(cache_key)
+    if cached:
+        _parse_cache.move_to_end(cache_key)
+        server_name, usernames, group_map = cached
+        logger.info("Parsed from cache: server_name=%s, usernames=%s", server_name, usernames)
+        return server_name, list(usernames), dict(group_map)
 
     logger.info("Parsing ticket body with Claude Sonnet 4 via Bedrock.")
 
+    # Static system prompt first, marked for prompt caching; only the ticket body varies
     payload = {
         "anthropic_version": "bedrock-2023-05-31",
         "max_tokens": max_tokens,
+        "system": [
+            {
+                "type": "text",
+                "text": SYSTEM_PROMPT,
+                "cache_control": {"type": "ephemeral"}
+            }
+        ],
         "messages": [
             {
                 "role": "user",
-                "content": f"{SYSTEM_PROMPT}\n\nUser Request:\n{ticket_body}"
+                "content": ticket_body
             }
         ]
     }
 
+    body = json_dumps(payload)
+
     # -------- Try Claude first --------
     for attempt in range(1, max_retries + 1):
         try:
             logger.info(json.dumps({"event": "invoke_model_attempt", "attempt": attempt}))
 
-            response = bedrock_runtime.invoke_model(
+            response = _bedrock().invoke_model_with_response_stream(
                 modelId=inference_profile_arn,
                 contentType="application/json",
                 accept="application/json",
-                body=json.dumps(payload).encode("utf-8")
+                body=body
             )
 
-            response_body = json.loads(response["body"].read())
-            model_text = response_body["content"][0]["text"]
+            model_text, parsed = _read_streamed_json(response["body"])
             logger.info(json.dumps({"event": "model_raw_output", "text": model_text}))
 
-            parsed = json.loads(model_text)
+            if parsed is None:
+                parsed = json_loads(model_text)
 
             server_name = parsed.get("server_name", "").strip()
             usernames = parsed.get("usernames", [])
@@ -185,6 +351,7 @@ def parse_ticket_for_tsplus(ticket_body):
                 "Parsed using Claude: server_name=%s, usernames=%s, group_map=%s",
                 server_name, usernames, group_map
             )
+            _cache_parse_result(cache_key, server_name, usernames, group_map)
             return server_name, usernames, group_map
 
         except Exception as e:
@@ -202,35 +369,21 @@ def parse_ticket_for_tsplus(ticket_body):
     logger.info("Fallback: Parsing ticket with regex & RapidFuzz.")
 
     ticket_body_norm = ticket_body.replace('\r\n', '\n').replace('\r', '\n')
-    ticket_body_norm = re.sub(r'\n+', '\n', ticket_body_norm).strip()
-    ticket_body_norm = re.sub(
-        r'(Regards,|Thanks,|Best,|Sincerely,).*$', '', ticket_body_norm,
-        flags=re.IGNORECASE | re.DOTALL
-    )
+    ticket_body_norm = _NEWLINES_RE.sub('\n', ticket_body_norm).strip()
+    ticket_body_norm = _SIGN_OFF_RE.sub('', ticket_body_norm)
+    lines = [line.strip() for line in ticket_body_norm.split('\n')]
+    lines = [line for line in lines if line]
 
     # Server name extraction
-    server_patterns = [
-        r"server named ([^\s:,;.!?]+)",
-        r"server is ([^\s:,;.!?]+)",
-        r"server[:\s]+([^\s;,]+)",
-        r"on server ([^\s:,;.!?]+)",
-        r"server\s*=\s*([^\s,;:.]+)",
-    ]
-
     server_name = ""
-    for line in ticket_body_norm.split('\n'):
-        line_clean = line.strip()
-        if not line_clean:
-            continue
-
-        if any(fuzz.partial_ratio(line_clean.lower(), kw) > 80 for kw in [
-            "server named", "server is", "server:"
-        ]):
-            for pattern in server_patterns:
-                match = re.search(pattern, line_clean, re.IGNORECASE)
+    for line_clean in lines:
+        line_lower = line_clean.lower()
+        if "server" in line_lower and _has_keyword(line_lower, _SERVER_KEYWORDS):
+            for pattern in _SERVER_RES:
+                match = pattern.search(line_clean)
                 if match:
                     server_name = match.group(1).strip().strip(".,;:")
-                    logger.debug("Server name matched with pattern %s: %s", pattern, server_name)
+                    logger.debug("Server name matched with pattern %s: %s", pattern.pattern, server_name)
                     break
         if server_name:
             break
@@ -240,24 +393,14 @@ def parse_ticket_for_tsplus(ticket_body):
         raise Exception("Server name not found in ticket body")
 
     # Usernames extraction
-    STOPWORDS = {
-        'could', 'you', 'the', 'rdp', 'server', 'named', 'create', 'following',
-        'users', 'assign', 'group', 'groups', 'also', 'all', 'three', 'and', 'to', 'be',
-        'on', 'please', 'kindly', 'should', 'with', 'team', 'for', 'request'
-    }
-
     usernames = []
-    user_block_match = re.search(
-        r"(?:create|following).*?users.*?:([\s\S]+?)(?:assign|map|to|$)",
-        ticket_body_norm, re.IGNORECASE
-    )
+    user_block_match = _USER_BLOCK_RE.search(ticket_body_norm)
     if user_block_match:
-        user_block = user_block_match.group(1)
-        for line in user_block.strip().split('\n'):
-            for token in re.split(r'[,;\s]+', line.strip()):
-                cleaned = re.sub(r'[^\w\-_.@]', '', token.strip())
-                if cleaned and cleaned.lower() not in STOPWORDS and len(cleaned) > 2:
-                    usernames.append(cleaned)
+        user_block = _NON_TOKEN_CHARS_RE.sub('', user_block_match.group(1))
+        usernames = [
+            token for token in _USERNAME_TOKEN_RE.findall(user_block)
+            if token.lower() not in _USERNAME_STOPWORDS
+        ]
 
     if not usernames:
         logger.error("No valid usernames found in ticket body (regex fallback).")
@@ -267,37 +410,25 @@ def parse_ticket_for_tsplus(ticket_body):
 
     # Group assignment extraction
     group_map = {user: "" for user in usernames}
-    group_patterns = [
-        r"assign (.*?) (?:group|role|access) to (.*?)(?:\s+and|\s*,|\s*$)",
-        r"(.*?) should be assigned to (.*?) (?:group|role|access)",
-        r"(.*?) assigned to (.*?) (?:group|role|access)",
-        r"give (.*?) access to (.*?) (?:group|role)",
-        r"add (.*?) to (.*?) (?:group|role|access)",
-        r"(.*?)[:\s]+(.*?) (?:group|role|access)",
-    ]
-
-    for line in ticket_body_norm.split('\n'):
-        line_clean = line.strip()
-        if not line_clean:
-            continue
+    respectively = 'respectively' in ticket_body_norm.lower()
 
-        if any(fuzz.partial_ratio(line_clean.lower(), kw) > 80 for kw in [
-            "assign", "map", "should be assigned", "add", "give access"
-        ]):
-            for pattern in group_patterns:
-                matches = re.findall(pattern, line_clean, re.IGNORECASE)
+    for line_clean in lines:
+        line_lower = line_clean.lower()
+        if any(word in line_lower for word in _GROUP_REQUIRED_WORDS) and _has_keyword(line_lower, _GROUP_KEYWORDS):
+            for pattern, groups_first in _GROUP_RES:
+                matches = pattern.findall(line_clean)
                 for match in matches:
                     if len(match) == 2:
-                        if "assign" in pattern and "to" in pattern:
+                        if groups_first:
                             groups_text, users_text = match
                         else:
                             users_text, groups_text = match
 
-                        groups_text = re.sub(r'^(also|please|kindly)\s+', '', groups_text.strip(), flags=re.IGNORECASE)
-                        groups = [re.sub(r'[\s\.,;]+$', '', g.strip()) for g in re.split(r'\s+and\s+|,\s*|;', groups_text.strip()) if g.strip()]
-                        users = [re.sub(r'[^\w\-_.@]', '', u.strip()) for u in re.split(r'\s+and\s+|,\s*|;', users_text.strip()) if u.strip()]
+                        groups_text = _GROUP_PREFIX_RE.sub('', groups_text.strip())
+                        groups = [_TRAILING_PUNCT_RE.sub('', g.strip()) for g in _LIST_SPLIT_RE.split(groups_text.strip()) if g.strip()]
+                        users = [_NON_USERNAME_CHARS_RE.sub('', u.strip()) for u in _LIST_SPLIT_RE.split(users_text.strip()) if u.strip()]
 
-                        if 'respectively' in ticket_body_norm.lower() and len(users) == len(groups):
+                        if respectively and len(users) == len(groups):
                             for u, g in zip(users, groups):
                                 if u in group_map:
                                     group_map[u] = g
@@ -310,32 +441,71 @@ def parse_ticket_for_tsplus(ticket_body):
     
     return server_name, usernames, group_map
 
+def _iter_account_items(email):
+    """
+    Yield account items for a customer email: email table lookup plus an AccountId
+    get_item first, then a paginated CustomerEmailIds scan if the email table is
+    not configured, missing, or has no row for this email.
+    """
+    projection = {
+        "ProjectionExpression": "AccountId, #regions",
+        "ExpressionAttributeNames": {"#regions": "Regions"}
+    }
+    email_table = _account_email_table()
+    if email_table is None:
+        logger.warning("ACCOUNT_EMAIL_TABLE_NAME not set; falling back to a full CustomerEmailIds scan.")
+    else:
+        try:
+            mapping = email_table.get_item(
+                Key={"EmailIdLower": email.lower()},
+                ProjectionExpression="AccountId"
+            ).get("Item")
+            item = None
+            if mapping:
+                item = _account_table().get_item(
+                    Key={"AccountId": mapping["AccountId"]}, **projection
+                ).get("Item")
+            if item:
+                yield item
+                return
+            logger.warning(
+                "No account found for %s in %s; falling back to a full CustomerEmailIds scan.",
+                email, ACCOUNT_EMAIL_TABLE_NAME
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ResourceNotFoundException":
+                raise
+            logger.warning(
+                "Table %s unavailable (%s); falling back to a full CustomerEmailIds scan.",
+                ACCOUNT_EMAIL_TABLE_NAME, e
+            )
+
+    scan_kwargs = {"FilterExpression": Attr("CustomerEmailIds").contains(email), **projection}
+    while True:
+        response = _account_table().scan(**scan_kwargs)
+        logger.info("DynamoDB scan page returned %d items", len(response.get("Items", [])))
+        yield from response.get("Items", [])
+        if "LastEvaluatedKey" not in response:
+            return
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
 def get_account_details_from_email(email):
     """
     Query DynamoDB to get account ID and allowed regions from customer email.
     """
     try:
-        response = account_table.scan(
-            FilterExpression="contains(CustomerEmailIds, :email)",
-            ExpressionAttributeValues={":email": email}
-        )
-        
-        logger.info("DynamoDB scan response: %s", response)
-        
-        for item in response.get("Items", []):
+        for item in _iter_account_items(email):
             # Parse regions - handle both comma-separated string and the region mapping
             regions_str = item.get("Regions", "")
             if regions_str:
-                region_names = [r.strip() for r in regions_str.split(",") if r.strip()]
-                # Convert region names to AWS region codes if needed
-                aws_regions = []
-                for region_name in region_names:
-                    if region_name in region_map:
-                        aws_regions.append(region_map[region_name])
-                    else:
-                        # If it's already an AWS region code, use it directly
-                        aws_regions.append(region_name)
-                
+                # Convert region names to AWS region codes; anything not in the
+                # map is assumed to already be a region code and used directly
+                aws_regions = [
+                    region_map.get(region_name, region_name)
+                    for region_name in (r.strip() for r in regions_str.split(","))
+                    if region_name
+                ]
+
                 return {
                     "AccountId": item["AccountId"],
                     "Regions": aws_regions
@@ -347,17 +517,41 @@ def get_account_details_from_email(email):
         logger.error("Error querying DynamoDB: %s", str(e))
         return None
 
-def create_tsplus_users_from_ticket(ticket_body: str, from_email: str = None):
+# Assumed-role credentials last an hour; reuse clients well inside that window
+ASSUMED_CLIENT_TTL_SECONDS = 3000
+_assumed_clients = {}
+
+def _assumed_role_clients(account_id, aws_region):
     """
-    Parses ticket body, assumes role if needed, creates (or uses existing) SSM document,
-    waits, and creates RDP users on the specified Windows server.
-    Now includes S3 upload functionality for .connect files.
+    EC2 and SSM clients for an assumed role, reused across warm invocations until the TTL passes.
     """
-    logger.info("Starting TSPlus user creation from ticket body.")
-
-    server_name, usernames, group_map = parse_ticket_for_tsplus(ticket_body)
-    logger.info("Parsed server_name=%s, usernames=%s", server_name, usernames)
+    key = (account_id, aws_region)
+    cached = _assumed_clients.get(key)
+    if cached and time.monotonic() < cached[0]:
+        logger.info("Reusing assumed-role clients for AccountId=%s, Region=%s", account_id, aws_region)
+        return cached[1], cached[2]
+
+    from cross_account_role import assume_role
+
+    session = assume_role(account_id)
+    ec2 = session.client("ec2", region_name=aws_region)
+    ssm = session.client("ssm", region_name=aws_region)
+    _assumed_clients[key] = (time.monotonic() + ASSUMED_CLIENT_TTL_SECONDS, ec2, ssm)
+    return ec2, ssm
+
+@lru_cache(maxsize=1)
+def _default_clients():
+    """
+    EC2 and SSM clients for the Lambda's own account.
+    """
+    return boto3.client("ec2"), boto3.client("ssm")
 
+def _get_clients(from_email):
+    """
+    EC2 and SSM clients for the sender's account (assumed role), or the
+    Lambda's own account when no sender email is given.
+    Returns (ec2, ssm, scope) where scope identifies the account/region.
+    """
     if from_email:
         actual_email = extract_email_address(from_email)
         logger.info("Original email: %s, Extracted: %s", from_email, actual_email)
@@ -372,14 +566,54 @@ def create_tsplus_users_from_ticket(ticket_body: str, from_email: str = None):
         aws_region = account_info["Regions"][0]
         logger.info("Found account info: AccountId=%s, Region=%s", account_id, aws_region)
 
-        session = assume_role(account_id)
-        ec2 = session.client("ec2", region_name=aws_region)
-        ssm = session.client("ssm", region_name=aws_region)
-    else:
-        ec2 = boto3.client("ec2")
-        ssm = boto3.client("ssm")
+        return (*_assumed_role_clients(account_id, aws_region), (account_id, aws_region))
+    return (*_default_clients(), None)
+
+# Users per SSM command. Each user is about 250-300 bytes of compact UsersJson
+# (raw JSON, with no Base64 overhead), so one batch is about 6 KB. That keeps
+# the parameter and the command script it is inlined into well within SSM size limits.
+SSM_USERS_PER_COMMAND = 20
+
+# Time for a newly created or updated SSM document to become usable by send_command
+SSM_DOCUMENT_PROPAGATION_SECONDS = 5
+
+# Running instances by (scope, Name tag), reused for a few minutes across warm invocations
+INSTANCE_CACHE_TTL_SECONDS = 300
+_instance_cache = {}
+
+def _resolve_instance(ec2, scope, server_name):
+    """
+    Find the running instance tagged with server_name. Returns (instance_id, private_ip).
+    """
+    key = (scope, server_name)
+    cached = _instance_cache.get(key)
+    if cached and time.monotonic() < cached[0]:
+        logger.info("Found instance (cached): ID=%s, PrivateIP=%s", cached[1], cached[2])
+        return cached[1], cached[2]
+
+    reservations = ec2.describe_instances(
+        Filters=[
+            {'Name': 'tag:Name', 'Values': [server_name]},
+            {'Name': 'instance-state-name', 'Values': ['running']}
+        ]
+    ).get("Reservations", [])
 
-    # Create or use existing SSM document
+    if not reservations or not reservations[0].get("Instances"):
+        raise Exception(f"No running instance found with Name tag: {server_name}")
+
+    instance = reservations[0]["Instances"][0]
+    instance_id = instance["InstanceId"]
+    private_ip = instance["PrivateIpAddress"]
+    logger.info("Found instance: ID=%s, PrivateIP=%s", instance_id, private_ip)
+    _instance_cache[key] = (time.monotonic() + INSTANCE_CACHE_TTL_SECONDS, instance_id, private_ip)
+    return instance_id, private_ip
+
+def _ensure_ssm_document(ssm):
+    """
+    Create the TSPlus SSM document (or use the existing one). Returns the
+    monotonic time at which it has propagated; the caller waits for that only
+    once it has users to send.
+    """
     try:
         logger.info("Creating SSM document: %s", SSM_DOCUMENT_NAME)
         ssm.create_document(
@@ -396,103 +630,106 @@ def create_tsplus_users_from_ticket(ticket_body: str, from_email: str = None):
             logger.error("Failed to create SSM document: %s", e)
             raise
 
-    logger.info("Waiting 5 seconds for document propagation...")
-    time.sleep(5)
+    return time.monotonic() + SSM_DOCUMENT_PROPAGATION_SECONDS
 
-    # Find instance
-    reservations = ec2.describe_instances(
-        Filters=[
-            {'Name': 'tag:Name', 'Values': [server_name]},
-            {'Name': 'instance-state-name', 'Values': ['running']}
-        ]
-    ).get("Reservations", [])
+def create_tsplus_users_from_ticket(ticket_body: str, from_email: str = None):
+    """
+    Parses ticket body, assumes role if needed, creates (or uses existing) SSM document,
+    waits, and creates RDP users on the specified Windows server.
+    Now includes S3 upload functionality for .connect files.
+    """
+    logger.info("Starting TSPlus user creation from ticket body.")
 
-    if not reservations or not reservations[0].get("Instances"):
-        raise Exception(f"No running instance found with Name tag: {server_name}")
+    # The Bedrock parse and the account/role/SSM document setup are independent,
+    # so run the parse in the background while the setup happens here
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        parse_future = executor.submit(parse_ticket_for_tsplus, ticket_body)
+        ec2, ssm, scope = _get_clients(from_email)
+        document_ready_at = _ensure_ssm_document(ssm)
+        server_name, usernames, group_map = parse_future.result()
+    logger.info("Parsed server_name=%s, usernames=%s", server_name, usernames)
 
-    instance = reservations[0]["Instances"][0]
-    instance_id = instance["InstanceId"]
-    private_ip = instance["PrivateIpAddress"]
-    logger.info("Found instance: ID=%s, PrivateIP=%s", instance_id, private_ip)
+    if not server_name or not usernames:
+        raise Exception(f"Could not parse server name and usernames from ticket: server_name={server_name}, usernames={usernames}")
+
+    # Find instance
+    instance_id, private_ip = _resolve_instance(ec2, scope, server_name)
+
+    # Wait out whatever is left of the document propagation time; the parse
+    # usually covers it
+    remaining = document_ready_at - time.monotonic()
+    if remaining > 0:
+        logger.info("Waiting %.1f seconds for document propagation...", remaining)
+        time.sleep(remaining)
 
-    # Shared ENV values
-    common_groups = os.getenv("CommonGroups", "")
-    must_change = os.getenv("UserMustChange", "")
-    can_change = os.getenv("UserCanChange", "")
-    never_expires = os.getenv("PasswordNeverExpires", "")
-    disabled = os.getenv("AccountDisabled", "")
-    display_mode = os.getenv("DisplayMode", "")
-    printer_action = os.getenv("PrinterAction", "")
-    printer_scale = os.getenv("PrinterScale", "")
-    
     # S3 config
-    s3_bucket_name = os.getenv("S3_BUCKET_NAME")
-    s3_prefix = os.getenv("S3_PREFIX", "tsplus-connect-files")
+    s3_bucket_name = ENV.s3_bucket_name
+    s3_prefix = ENV.s3_prefix
     if not s3_bucket_name:
         logger.warning("S3_BUCKET_NAME not set. .connect files will not be uploaded to S3.")
     else:
         logger.info("S3 configuration: Bucket=%s, Prefix=%s", s3_bucket_name, s3_prefix)
 
-    # Prepare user data
+    # Prepare user data and the credentials to report in one pass; a username
+    # listed twice keeps a single password
     passwords = {user: generate_password() for user in usernames}
     users = []
+    user_credentials = []
     for user in usernames:
+        password = passwords[user]
+        groups = group_map.get(user, "")
         users.append({
             "Username": user,
-            "PasswordPlain": passwords[user],
+            "PasswordPlain": password,
             "ServerIP": private_ip,
-            "UserMustChange": must_change,
-            "UserCanChange": can_change,
-            "PasswordNeverExpires": never_expires,
-            "AccountDisabled": disabled,
-            "CommonGroups": common_groups,
-            "Groups": group_map.get(user, ""),
-            "DisplayMode": display_mode,
-            "PrinterAction": printer_action,
-            "PrinterScale": printer_scale
+            "UserMustChange": ENV.must_change,
+            "UserCanChange": ENV.can_change,
+            "PasswordNeverExpires": ENV.never_expires,
+            "AccountDisabled": ENV.disabled,
+            "CommonGroups": ENV.common_groups,
+            "Groups": groups,
+            "DisplayMode": ENV.display_mode,
+            "PrinterAction": ENV.printer_action,
+            "PrinterScale": ENV.printer_scale
+        })
+        user_credentials.append({
+            "Username": user,
+            "Password": password,
+            "Groups": groups,
+            "ServerIP": private_ip
         })
-
-    users_json_b64 = base64.b64encode(json.dumps(users).encode("utf-8")).decode("utf-8")
-    logger.info("Final SSM Payload (base64): %s", users_json_b64)
-
-    ssm_parameters = {"UsersJsonBase64": [users_json_b64]}
-    if s3_bucket_name:
-        ssm_parameters["S3BucketName"] = [s3_bucket_name]
-        ssm_parameters["S3Prefix"] = [s3_prefix]
 
     try:
-        response = ssm.send_command(
-            DocumentName=SSM_DOCUMENT_NAME,
-            InstanceIds=[instance_id],
-            Parameters=ssm_parameters,
-        )
-        command_id = response["Command"]["CommandId"]
-        logger.info("SSM command sent successfully: CommandId=%s", command_id)
+        command_ids = _send_user_batches(ssm, instance_id, users, s3_bucket_name, s3_prefix)
     except ClientError as e:
-        logger.error("Failed to send SSM command: %s", e)
-        raise
+        if e.response["Error"]["Code"] != "InvalidInstanceId":
+            raise
+        # The cached instance may have been replaced since it was looked up;
+        # drop it, resolve the Name tag again and retry once
+        logger.warning("Instance %s rejected by SSM; resolving %s again.", instance_id, server_name)
+        _instance_cache.pop((scope, server_name), None)
+        instance_id, private_ip = _resolve_instance(ec2, scope, server_name)
+        for entry in users + user_credentials:
+            entry["ServerIP"] = private_ip
+        command_ids = _send_user_batches(ssm, instance_id, users, s3_bucket_name, s3_prefix)
+    command_id = command_ids[0]
 
     # Wait for SSM command output
-    try:
-        stdout, stderr = wait_for_ssm_command_and_get_output(ssm, instance_id, command_id)
-        logger.info("SSM command output fetched successfully.")
-    except Exception as e:
-        logger.error("Error waiting for SSM command output: %s", e, exc_info=True)
-        stdout, stderr = None, None
+    with ThreadPoolExecutor(max_workers=len(command_ids)) as executor:
+        results = list(executor.map(lambda cid: _wait_for_command_output(ssm, instance_id, cid), command_ids))
+    stdout_parts = [r["StandardOutput"] for r in results if r["StandardOutput"]]
+    stdout = "\n".join(stdout_parts) if stdout_parts else None
 
-    user_credentials = []
-    for user in usernames:
-        user_credentials.append({
-            "Username": user,
-            "Password": passwords[user],
-            "Groups": group_map.get(user, ""),
-            "ServerIP": private_ip
-        })
+    # A batch only counts as done when every command in it succeeded
+    failed = [r["CommandId"] for r in results if r["Status"] != "Success"]
+    if failed:
+        logger.error("%d of %d SSM commands did not succeed: %s", len(failed), len(results), failed)
 
     return {
-        "statusCode": 200,
-        "message": "TSPlus SSM command completed",
+        "statusCode": 500 if failed else 200,
+        "message": "TSPlus SSM command failed" if failed else "TSPlus SSM command completed",
         "CommandId": command_id,
+        "CommandIds": command_ids,
         "InstanceID": instance_id,
         "ServerName": server_name,
         "UserCredentials": user_credentials,
@@ -502,84 +739,91 @@ def create_tsplus_users_from_ticket(ticket_body: str, from_email: str = None):
             "Prefix": s3_prefix,
             "Enabled": bool(s3_bucket_name)
         },
-        "SSMOutput": stdout
+        "SSMOutput": stdout,
+        "CommandResults": [
+            {"CommandId": r["CommandId"], "Status": r["Status"], "StandardError": r["StandardError"]}
+            for r in results
+        ],
+        "FailedCommandIds": failed
     }
 
-def wait_for_ssm_command_and_get_output(ssm_client, instance_id, command_id, max_attempts=30, delay=5):
+def _send_user_batches(ssm, instance_id, users, s3_bucket_name, s3_prefix):
     """
-    Waits for the SSM command execution to finish and retrieves stdout/stderr.
-    Retries on InvocationDoesNotExist since it often takes a few seconds for
-    command invocations to propagate.
+    Send the users in batches of SSM_USERS_PER_COMMAND. Returns the CommandIds.
     """
-    attempt = 0
-    while attempt < max_attempts:
-        try:
-            response = ssm_client.get_command_invocation(
-                CommandId=command_id,
-                InstanceId=instance_id
-            )
+    # Large tickets are split into several commands that run side by side on the instance
+    return [
+        _send_users_command(ssm, instance_id, users[i:i + SSM_USERS_PER_COMMAND], s3_bucket_name, s3_prefix)
+        for i in range(0, len(users), SSM_USERS_PER_COMMAND)
+    ]
 
-            status = response["Status"]
-            logger.debug("Attempt %d: SSM command status: %s", attempt + 1, status)
-
-            if status in ["Pending", "InProgress", "Delayed"]:
-                time.sleep(delay)
-                attempt += 1
-            elif status in ["Success", "Cancelled", "Failed", "TimedOut", "Cancelling"]:
-                stdout = response.get("StandardOutputContent", "")
-                stderr = response.get("StandardErrorContent", "")
-                logger.info("SSM command finished with status %s", status)
-                return stdout, stderr
-            else:
-                logger.warning("Unknown SSM command status: %s", status)
-                time.sleep(delay)
-                attempt += 1
-
-        except botocore.exceptions.ClientError as e:
-            error_code = e.response["Error"]["Code"]
-            if error_code == "InvocationDoesNotExist":
-                logger.debug("InvocationDoesNotExist: waiting for command invocation to register...")
-                time.sleep(2)
-                attempt += 1
-            else:
-                logger.error("Unexpected error waiting for SSM command: %s", e, exc_info=True)
-                raise
+def _send_users_command(ssm, instance_id, users, s3_bucket_name, s3_prefix):
+    """
+    Send one SSM command creating the given users. Returns the CommandId.
+    """
+    # Compact JSON has no raw newlines, so it is safe inside the document's
+    # single-quoted PowerShell here-string
+    users_json = json.dumps(users, separators=(",", ":"))
+    logger.info("SSM payload: %d users, %d bytes", len(users), len(users_json))
 
-    raise TimeoutError(f"SSM command did not complete within {max_attempts * delay} seconds")
+    ssm_parameters = {"UsersJson": [users_json]}
+    if s3_bucket_name:
+        ssm_parameters["S3BucketName"] = [s3_bucket_name]
+        ssm_parameters["S3Prefix"] = [s3_prefix]
 
-def get_account_details_from_email(email):
+    try:
+        response = ssm.send_command(
+            DocumentName=SSM_DOCUMENT_NAME,
+            InstanceIds=[instance_id],
+            Parameters=ssm_parameters,
+        )
+        command_id = response["Command"]["CommandId"]
+        logger.info("SSM command sent successfully: CommandId=%s (%d users)", command_id, len(users))
+        return command_id
+    except ClientError as e:
+        logger.error("Failed to send SSM command: %s", e)
+        raise
+
+def _wait_for_command_output(ssm, instance_id, command_id):
     """
-    Query DynamoDB to get account ID and allowed regions from customer email.
+    Wait for one SSM command and return its CommandId, Status, StandardOutput
+    and StandardError. If waiting fails, Status is "WaitFailed" and
+    StandardError carries the error.
     """
     try:
-        response = account_table.scan(
-            FilterExpression="contains(CustomerEmailIds, :email)",
-            ExpressionAttributeValues={":email": email}
-        )
-        
-        logger.info("DynamoDB scan response: %s", response)
-        
-        for item in response.get("Items", []):
-            # Parse regions - handle both comma-separated string and the region mapping
-            regions_str = item.get("Regions", "")
-            if regions_str:
-                region_names = [r.strip() for r in regions_str.split(",") if r.strip()]
-                # Convert region names to AWS region codes if needed
-                aws_regions = []
-                for region_name in region_names:
-                    if region_name in region_map:
-                        aws_regions.append(region_map[region_name])
-                    else:
-                        # If it's already an AWS region code, use it directly
-                        aws_regions.append(region_name)
-                
-                return {
-                    "AccountId": item["AccountId"],
-                    "Regions": aws_regions
-                }
-        
-        return None
-        
+        stdout, stderr, status = wait_for_ssm_command_and_get_output(ssm, instance_id, command_id)
+        logger.info("SSM command output fetched successfully: CommandId=%s", command_id)
     except Exception as e:
-        logger.error("Error querying DynamoDB: %s", str(e))
-        return None
\ No newline at end of file
+        logger.error("Error waiting for SSM command output: %s", e, exc_info=True)
+        stdout, stderr, status = None, str(e), "WaitFailed"
+    return {"CommandId": command_id, "Status": status, "StandardOutput": stdout, "StandardError": stderr}
+
+def wait_for_ssm_command_and_get_output(ssm_client, instance_id, command_id, max_attempts=75, delay=2):
+    """
+    Waits for the SSM command execution to finish and retrieves stdout, stderr
+    and the final invocation status.
+    Uses the SSM command_executed waiter, which also retries on
+    InvocationDoesNotExist while the invocation propagates.
+    """
+    try:
+        ssm_client.get_waiter("command_executed").wait(
+            CommandId=command_id,
+            InstanceId=instance_id,
+            WaiterConfig={"Delay": delay, "MaxAttempts": max_attempts}
+        )
+    except WaiterError as e:
+        if "Max attempts exceeded" in str(e):
+            raise TimeoutError(f"SSM command did not complete within {max_attempts * delay} seconds")
+        # Failed/Cancelled/TimedOut are terminal states; their output is still returned below
+        if "Status" not in (e.last_response or {}):
+            logger.error("Unexpected error waiting for SSM command: %s", e, exc_info=True)
+            raise
+
+    response = ssm_client.get_command_invocation(
+        CommandId=command_id,
+        InstanceId=instance_id
+    )
+    stdout = response.get("StandardOutputContent", "")
+    stderr = response.get("StandardErrorContent", "")
+    logger.info("SSM command finished with status %s", response["Status"])
+    return stdout, stderr, response["Status"]
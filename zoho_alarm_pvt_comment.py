@@ -1,112 +1,67 @@
-import requests
-import json
 import logging
-import time
-import boto3
-import base64
-import mimetypes
 
-from typing import Optional
-from requests.adapters import HTTPAdapter, Retry
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Optional, Union
 
-from constants import CLIENT_ID, CLIENT_SECRET, REFRESH_TOKEN, ORG_ID, REGION
+from zoho_auth import TICKET_ATTACHMENTS_URL, TICKET_COMMENTS_URL, get_access_token, post_json, post_multipart
+from shared_utils import json_loads
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-SECRET_NAME = "zoho-automation-secrets"
-TOKEN_VALIDITY_SECONDS = 3600
-TOKEN_BUFFER_SECONDS = 5
+SUPPORTED_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.pdf', '.txt', '.doc', '.docx', '.xlsx'})
 
-SUPPORTED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.pdf', '.txt', '.doc', '.docx', '.xlsx'}
-
-session = requests.Session()
-retries = Retry(total=3, backoff_factor=1, status_forcelist=[500, 502, 503, 504])
-adapter = HTTPAdapter(max_retries=retries)
-session.mount("https://", adapter)
-
-
-def get_secret(secret_name: str = SECRET_NAME, region_name: str = REGION) -> dict:
-    client = boto3.client("secretsmanager", region_name=region_name)
-    response = client.get_secret_value(SecretId=secret_name)
-    return json.loads(response["SecretString"])
-
-
-def update_secret(secret_name: str, updated_data: dict, region_name: str = REGION) -> None:
-    client = boto3.client("secretsmanager", region_name=region_name)
-    client.put_secret_value(
-        SecretId=secret_name,
-        SecretString=json.dumps(updated_data)
-    )
-
-
-def get_access_token() -> str:
-    logger.info("Retrieving access token from Secrets Manager...")
-    secrets = get_secret()
-
-    access_token = secrets.get("ACCESS_TOKEN")
-    expiry_time = secrets.get("ACCESS_TOKEN_EXPIRY")
-    current_time = int(time.time())
-
-    if access_token and expiry_time and current_time < (expiry_time - TOKEN_BUFFER_SECONDS):
-        logger.info("Using cached access token.")
-        return access_token
-
-    logger.info("Access token expired or missing. Refreshing from Zoho...")
-
-    token_url = "https://accounts.zoho.com/oauth/v2/token"
-    params = {
-        "client_id": CLIENT_ID,
-        "client_secret": CLIENT_SECRET,
-        "grant_type": "refresh_token",
-        "refresh_token": REFRESH_TOKEN
-    }
-
-    response = session.post(token_url, params=params)
-    if response.status_code != 200:
-        logger.error(f"Failed to refresh token. Status: {response.status_code}, Response: {response.text}")
-        response.raise_for_status()
-
-    new_token = response.json().get("access_token")
-    if not new_token:
-        raise Exception("No access token received in Zoho response.")
-
-    secrets["ACCESS_TOKEN"] = new_token
-    secrets["ACCESS_TOKEN_EXPIRY"] = current_time + TOKEN_VALIDITY_SECONDS
-    update_secret(SECRET_NAME, secrets)
-
-    logger.info("Access token refreshed and cached.")
-    return new_token
+# Decoded attachments stay in memory up to this size and spill to /tmp beyond it
+ATTACHMENT_SPOOL_MAX_BYTES = 1 << 20
+# Base64 characters decoded per step; a multiple of 4 keeps every chunk aligned
+_BASE64_CHUNK_CHARS = 4 * 65536
 
 
 def is_supported_file_type(filename: str) -> bool:
-    extension = f".{filename.lower().rpartition('.')[-1]}"
-    return extension in SUPPORTED_EXTENSIONS
+    # Lowercase only the suffix, not the whole filename
+    dot = filename.rfind('.')
+    return dot >= 0 and filename[dot:].lower() in SUPPORTED_EXTENSIONS
 
 
-def upload_attachment(ticket_id: str, image_bytes: bytes, image_filename: str) -> str:
+def _spool_base64(data: str):
+    """
+    Decode base64 text into a SpooledTemporaryFile chunk by chunk, so the
+    decoded attachment never sits in memory as one extra full-size copy.
+    """
+    import base64
+    import binascii
+    import tempfile
+
+    spool = tempfile.SpooledTemporaryFile(max_size=ATTACHMENT_SPOOL_MAX_BYTES)
+    try:
+        for start in range(0, len(data), _BASE64_CHUNK_CHARS):
+            spool.write(binascii.a2b_base64(data[start:start + _BASE64_CHUNK_CHARS]))
+    except binascii.Error:
+        # Embedded line breaks shift the chunk boundaries; decode in one go instead
+        spool.seek(0)
+        spool.truncate()
+        spool.write(base64.b64decode(data))
+    spool.seek(0)
+    return spool
+
+
+def upload_attachment(ticket_id: str, image_bytes: Union[bytes, BinaryIO], image_filename: str,
+                      access_token: Optional[str] = None) -> str:
     """
     Upload an attachment to the Zoho ticket and return the attachment ID.
+    image_bytes may be raw bytes or a readable binary file object.
+    Pass access_token to reuse a token the caller already holds.
     """
-    access_token = get_access_token()
-    url = f"https://desk.zoho.com/api/v1/tickets/{ticket_id}/attachments"
-    headers = {
-        "Authorization": f"Zoho-oauthtoken {access_token}",
-        "orgId": ORG_ID,
-    }
+    import mimetypes
 
-    files = {
+    fields = {
         'file': (image_filename, image_bytes, mimetypes.guess_type(image_filename)[0] or 'application/octet-stream')
     }
 
     logger.info(f"Uploading attachment {image_filename} to ticket {ticket_id}...")
 
-    response = session.post(url, headers=headers, files=files)
-    if response.status_code not in (200, 201):
-        logger.error(f"Failed to upload attachment. Status: {response.status_code}, Response: {response.text}")
-        response.raise_for_status()
-
-    attachment_info = response.json()
+    response = post_multipart(TICKET_ATTACHMENTS_URL, ticket_id, fields, access_token)
+    attachment_info = json_loads(response.content)
 
     # Handle both possible response formats from Zoho API
     if 'data' in attachment_info and isinstance(attachment_info['data'], list) and len(attachment_info['data']) > 0:
@@ -121,27 +76,29 @@ def upload_attachment(ticket_id: str, image_bytes: bytes, image_filename: str) -
 
 
 def add_private_comment_with_attachment(ticket_id: str, comment_text: str, image_base64: str, image_filename: str) -> dict:
+    """
+    Upload the attachment and post it as a private comment on the ticket.
+    Returns {"status": <HTTP status>} of the comment POST.
+    """
     if not ticket_id or not image_base64 or not image_filename or not comment_text:
         raise ValueError("Missing required parameters: ticket_id, image_base64, image_filename, comment_text")
 
     if not is_supported_file_type(image_filename):
         raise ValueError(f"Unsupported file type for attachment: {image_filename}")
 
-    # Decode base64 image bytes
-    image_bytes = base64.b64decode(image_base64)
+    # Fetch the token once, in the background while the image is decoded,
+    # and use it for both the upload and the comment
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        token_future = executor.submit(get_access_token)
+        image_file = _spool_base64(image_base64)
+        access_token = token_future.result()
 
     # Step 1: Upload attachment and get attachment ID
-    attachment_id = upload_attachment(ticket_id, image_bytes, image_filename)
-
-    # Step 2: Post private comment referencing the attachment ID
-    access_token = get_access_token()
-    url = f"https://desk.zoho.com/api/v1/tickets/{ticket_id}/comments"
-    headers = {
-        "Authorization": f"Zoho-oauthtoken {access_token}",
-        "orgId": ORG_ID,
-        "Content-Type": "application/json"
-    }
+    with image_file:
+        attachment_id = upload_attachment(ticket_id, image_file, image_filename, access_token)
 
+    # Step 2: Post private comment referencing the attachment ID. The token is
+    # re-read from memory in case the upload had to refresh it.
     comment_payload = {
         "isPublic": False,
         "attachmentIds": [attachment_id],
@@ -151,10 +108,10 @@ def add_private_comment_with_attachment(ticket_id: str, comment_text: str, image
 
     logger.info(f"Posting private comment with attachment to ticket {ticket_id}...")
 
-    response = session.post(url, headers=headers, json=comment_payload)
-    if response.status_code not in (200, 201):
-        logger.error(f"Failed to post comment. Status: {response.status_code}, Response: {response.text}")
-        response.raise_for_status()
-
+    response = post_json(TICKET_COMMENTS_URL, ticket_id, comment_payload)
     logger.info(f"Private comment posted successfully to ticket {ticket_id}")
-    return response.json()
+    # Callers only log the result, so the comment body is not parsed
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Zoho comment response: {response.text}")
+    return {"status": response.status_code}
+
@@ -0,0 +1,314 @@
+"""
+Zoho OAuth plumbing and authenticated Desk API calls shared by the Zoho
+comment modules. Secrets Manager access, the in-memory access token and the
+shared HTTP session live here so a refresh on one code path is reused by the
+others within the same warm container.
+"""
+import io
+import logging
+import os
+import tempfile
+import threading
+import urllib.request
+import time
+
+from functools import lru_cache
+from typing import Optional
+
+import boto3
+from botocore.config import Config
+
+from constants import CLIENT_ID, CLIENT_SECRET, REFRESH_TOKEN, ORG_ID, REGION
+from zoho_http import REQUEST_TIMEOUT, SESSION
+from shared_utils import json_loads, json_dumps
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+SECRET_NAME = "zoho-automation-secrets"
+TOKEN_VALIDITY_SECONDS = 3600
+TOKEN_BUFFER_SECONDS = 5
+
+# Desk API endpoints, formatted with the ticket ID
+TICKET_COMMENTS_URL = "https://desk.zoho.com/api/v1/tickets/{ticket_id}/comments"
+TICKET_ATTACHMENTS_URL = "https://desk.zoho.com/api/v1/tickets/{ticket_id}/attachments"
+
+# Headers that never change between calls; only Authorization is added per request
+_BASE_MULTIPART_HEADERS = {"orgId": ORG_ID}
+_BASE_JSON_HEADERS = {"orgId": ORG_ID, "Content-Type": "application/json"}
+
+# Set when the AWS Parameters and Secrets Lambda Extension layer is attached;
+# reads then go to its localhost cache instead of calling Secrets Manager.
+SECRETS_EXTENSION_PORT = os.environ.get("PARAMETERS_SECRETS_EXTENSION_HTTP_PORT")
+
+# How long INIT waits for prewarm() before moving on; Lambda fails INIT at
+# 10 s, and the token fetch with its timeouts and retries can take longer.
+PREWARM_DEADLINE_SECONDS = 3
+
+# Access token kept in memory across warm invocations; Secrets Manager is only
+# consulted when this copy is missing or about to expire.
+_CACHED_TOKEN: Optional[str] = None
+_CACHED_EXPIRY: int = 0
+_TOKEN_LOCK = threading.Lock()
+
+# Lambda SnapStart runtime hooks; only present in SnapStart-enabled runtimes
+try:
+    from snapshot_restore_py import register_after_restore
+except ImportError:
+    register_after_restore = None
+
+
+@lru_cache(maxsize=None)
+def _sm_client(region_name: str):
+    """
+    One Secrets Manager client per region, reused across warm invocations.
+    """
+    config = Config(tcp_keepalive=True, retries={"max_attempts": 3, "mode": "standard"})
+    return boto3.client("secretsmanager", region_name=region_name, config=config)
+
+
+def _get_secret_from_extension(secret_name: str) -> dict:
+    url = f"http://localhost:{SECRETS_EXTENSION_PORT}/secretsmanager/get?secretId={secret_name}"
+    request = urllib.request.Request(
+        url, headers={"X-Aws-Parameters-Secrets-Token": os.environ["AWS_SESSION_TOKEN"]}
+    )
+    with urllib.request.urlopen(request, timeout=2) as response:
+        return json_loads(json_loads(response.read())["SecretString"])
+
+
+def get_secret(secret_name: str = SECRET_NAME, region_name: str = REGION, use_extension: bool = True) -> dict:
+    """
+    Read a JSON secret. With use_extension, reads go through the secrets
+    extension when it is attached; its copy can be up to its cache TTL old,
+    so callers that write the secret back must pass use_extension=False.
+    """
+    if use_extension and SECRETS_EXTENSION_PORT:
+        try:
+            return _get_secret_from_extension(secret_name)
+        except Exception as e:
+            logger.warning(f"Secrets extension lookup failed, falling back to Secrets Manager: {e}")
+    response = _sm_client(region_name).get_secret_value(SecretId=secret_name)
+    return json_loads(response["SecretString"])
+
+
+def update_secret(secret_name: str, updated_data: dict, region_name: str = REGION) -> None:
+    _sm_client(region_name).put_secret_value(
+        SecretId=secret_name,
+        SecretString=json_dumps(updated_data)
+    )
+
+
+def get_access_token(force_refresh: bool = False) -> str:
+    """
+    Return a valid Zoho access token, refreshing it from Zoho when the
+    in-memory and stored copies are missing or about to expire.
+    force_refresh skips both copies, for when Zoho has rejected the token.
+    """
+    if not force_refresh and _memory_token_valid():
+        return _CACHED_TOKEN
+
+    seen_token = _CACHED_TOKEN
+    with _TOKEN_LOCK:
+        # Another thread may have refreshed the token while we waited; a forced
+        # refresh only reuses it if it differs from the token that was rejected
+        if (not force_refresh or _CACHED_TOKEN != seen_token) and _memory_token_valid():
+            return _CACHED_TOKEN
+        return _fetch_access_token(force_refresh)
+
+
+def _memory_token_valid() -> bool:
+    return bool(_CACHED_TOKEN) and int(time.time()) < _CACHED_EXPIRY - TOKEN_BUFFER_SECONDS
+
+
+def _fetch_access_token(force_refresh: bool) -> str:
+    global _CACHED_TOKEN, _CACHED_EXPIRY
+
+    current_time = int(time.time())
+    logger.info("Retrieving access token from Secrets Manager...")
+    secrets = None
+    if not force_refresh:
+        secrets = get_secret()
+        token = _use_stored_token(secrets, current_time)
+        if token:
+            return token
+
+    # The secret also holds other modules' tokens and is written back whole
+    # below, so the refresh works from Secrets Manager itself rather than the
+    # extension's possibly stale copy, which may also predate a refresh
+    # another container has already done.
+    if secrets is None or SECRETS_EXTENSION_PORT:
+        secrets = get_secret(use_extension=False)
+        if not force_refresh:
+            token = _use_stored_token(secrets, current_time)
+            if token:
+                return token
+
+    logger.info("Access token expired or missing. Refreshing from Zoho...")
+
+    token_url = "https://accounts.zoho.com/oauth/v2/token"
+    params = {
+        "client_id": CLIENT_ID,
+        "client_secret": CLIENT_SECRET,
+        "grant_type": "refresh_token",
+        "refresh_token": REFRESH_TOKEN
+    }
+
+    response = SESSION.post(token_url, params=params, timeout=REQUEST_TIMEOUT)
+    if response.status_code != 200:
+        logger.error(f"Failed to refresh token. Status: {response.status_code}, Response: {response.text}")
+        response.raise_for_status()
+
+    token_data = json_loads(response.content)
+    new_token = token_data.get("access_token")
+    if not new_token:
+        raise Exception("No access token received in Zoho response.")
+
+    # Trust Zoho's own lifetime for the token; the buffer is applied when reading
+    ttl = int(token_data.get("expires_in") or TOKEN_VALIDITY_SECONDS)
+    secrets["ACCESS_TOKEN"] = new_token
+    secrets["ACCESS_TOKEN_EXPIRY"] = current_time + ttl
+    # Written before returning: Lambda freezes the process once the handler
+    # returns, so a queued background write could be lost, and every other
+    # container and module reading the secret would then refresh again
+    update_secret(SECRET_NAME, secrets)
+    _CACHED_TOKEN, _CACHED_EXPIRY = new_token, secrets["ACCESS_TOKEN_EXPIRY"]
+
+    logger.info("Access token refreshed and cached.")
+    return new_token
+
+
+def _use_stored_token(secrets: dict, current_time: int) -> Optional[str]:
+    """
+    Cache and return the stored access token if it is not about to expire.
+    """
+    global _CACHED_TOKEN, _CACHED_EXPIRY
+
+    access_token = secrets.get("ACCESS_TOKEN")
+    expiry_time = secrets.get("ACCESS_TOKEN_EXPIRY")
+    if access_token and expiry_time and current_time < (int(expiry_time) - TOKEN_BUFFER_SECONDS):
+        logger.info("Using cached access token.")
+        _CACHED_TOKEN, _CACHED_EXPIRY = access_token, int(expiry_time)
+        return access_token
+    return None
+
+
+def _multipart_body(fields: dict, headers: dict) -> dict:
+    """
+    Build the request body for a multipart upload, setting its Content-Type
+    in headers. Streams through requests-toolbelt when it is available
+    instead of assembling the whole attachment in memory first.
+    """
+    try:
+        from requests_toolbelt.multipart.encoder import MultipartEncoder
+    except ImportError:
+        headers.pop("Content-Type", None)
+        return {"files": fields}
+    encoder = MultipartEncoder(fields=fields)
+    headers["Content-Type"] = encoder.content_type
+    return {"data": encoder}
+
+
+def _with_length(fileobj):
+    """
+    MultipartEncoder sizes a file through its `len` attribute before falling
+    back to fileno(), which would roll an in-memory SpooledTemporaryFile over
+    to /tmp. Record the length, measured with seek/tell, so the spool is
+    streamed as it is, whether it is in memory or on disk.
+    """
+    if isinstance(fileobj, tempfile.SpooledTemporaryFile):
+        position = fileobj.tell()
+        fileobj.len = fileobj.seek(0, io.SEEK_END)
+        fileobj.seek(position)
+    return fileobj
+
+
+def _post(url: str, headers: dict, access_token: Optional[str], build_body):
+    """
+    POST to Zoho with the access token. If Zoho rejects the token with 401
+    before its recorded expiry, refresh it and retry once. build_body is
+    called per attempt so streamed bodies are rebuilt for the retry.
+    Raises for any response other than 200/201.
+    """
+    headers["Authorization"] = f"Zoho-oauthtoken {access_token or get_access_token()}"
+    response = SESSION.post(url, headers=headers, timeout=REQUEST_TIMEOUT, **build_body(headers))
+    if response.status_code == 401:
+        headers["Authorization"] = f"Zoho-oauthtoken {get_access_token(force_refresh=True)}"
+        response = SESSION.post(url, headers=headers, timeout=REQUEST_TIMEOUT, **build_body(headers))
+
+    if response.status_code not in (200, 201):
+        logger.error(f"Zoho request to {url} failed. Status: {response.status_code}, Response: {response.text}")
+        response.raise_for_status()
+    return response
+
+
+def post_json(url_template: str, ticket_id: str, payload: dict, access_token: Optional[str] = None):
+    """
+    POST a JSON payload to a Desk ticket endpoint and return the response.
+    """
+    return _post(url_template.format(ticket_id=ticket_id), dict(_BASE_JSON_HEADERS), access_token,
+                 lambda headers: {"json": payload})
+
+
+def post_multipart(url_template: str, ticket_id: str, fields: dict, access_token: Optional[str] = None):
+    """
+    POST multipart form fields to a Desk ticket endpoint and return the response.
+    File objects in fields are rewound before each attempt.
+    """
+    def build_body(headers):
+        body_fields = {}
+        for name, field in fields.items():
+            if isinstance(field, tuple) and hasattr(field[1], "seek"):
+                field[1].seek(0)
+                field = (field[0], _with_length(field[1])) + field[2:]
+            body_fields[name] = field
+        return _multipart_body(body_fields, headers)
+
+    return _post(url_template.format(ticket_id=ticket_id), dict(_BASE_MULTIPART_HEADERS), access_token, build_body)
+
+
+def _prewarm() -> None:
+    """
+    Fetch the access token and open the TLS connection to Zoho during Lambda
+    INIT so the first invocation does not pay for either. Best effort: every
+    error is swallowed.
+    """
+    try:
+        get_access_token()
+        SESSION.head("https://desk.zoho.com/", timeout=2)
+    except Exception as e:
+        logger.warning(f"Zoho pre-warm failed, continuing without it: {e}")
+
+
+def _reset_warm_state() -> None:
+    """
+    Drop state that does not survive a SnapStart snapshot: the access token
+    captured at INIT and the pooled sockets of the Zoho session and Secrets
+    Manager clients. The TLS connection to Zoho is then reopened.
+    """
+    global _CACHED_TOKEN, _CACHED_EXPIRY
+
+    _CACHED_TOKEN, _CACHED_EXPIRY = None, 0
+    _sm_client.cache_clear()
+    SESSION.close()
+    try:
+        SESSION.head("https://desk.zoho.com/", timeout=2)
+    except Exception as e:
+        logger.warning(f"Zoho connection re-warm after restore failed: {e}")
+
+
+def prewarm() -> None:
+    """
+    Run the pre-warm during Lambda INIT, waiting at most
+    PREWARM_DEADLINE_SECONDS. It runs on a daemon thread so a slow Zoho or
+    Secrets Manager can never block INIT past the deadline; if it is still
+    running, the first invocation waits on the token lock instead of
+    refreshing a second time. Called by the Lambda whose handler uses Zoho
+    first thing, not at import, so other importers are unaffected.
+    """
+    thread = threading.Thread(target=_prewarm, name="zoho-prewarm", daemon=True)
+    thread.start()
+    thread.join(PREWARM_DEADLINE_SECONDS)
+
+
+if register_after_restore is not None:
+    register_after_restore(_reset_warm_state)
@@ -0,0 +1,34 @@
+"""
+Shared HTTP session for Zoho API calls.
+One keep-alive connection pool per container, reused across warm invocations
+by every module that talks to accounts.zoho.com or desk.zoho.com.
+"""
+import os
+
+import requests
+from requests.adapters import HTTPAdapter, Retry
+
+# (connect, read) seconds for every Zoho call, so a hung endpoint cannot use
+# up the whole Lambda timeout
+REQUEST_TIMEOUT = (2, 5)
+
+SESSION = requests.Session()
+SESSION.headers["Connection"] = "keep-alive"
+# Proxy, netrc and CA-bundle settings (HTTPS_PROXY, NO_PROXY,
+# REQUESTS_CA_BUNDLE) are honoured by default. Deployments that set none of
+# them can skip the per-request environment lookups with ZOHO_HTTP_IGNORE_ENV=true.
+SESSION.trust_env = os.getenv("ZOHO_HTTP_IGNORE_ENV", "").lower() != "true"
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=4,
+    pool_block=False,
+    # Short backoff (0s, then 0.2s) keeps a transient failure well inside the
+    # Lambda budget. POST stays out of the retryable methods: a replayed comment
+    # could post twice, and a streamed upload body cannot be resent.
+    max_retries=Retry(
+        total=2,
+        backoff_factor=0.1,
+        status_forcelist=[429, 500, 502, 503, 504],
+        respect_retry_after_header=True
+    )
+))